@@ -1,163 +1,158 @@
 import sqlite3
-import math
-import unicodedata
+import argparse
+import io
+import functools
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 
-DB_NAME = "parking_data.db"
-
-# --- Fonctions utilitaires réutilisées de view_data.py ---
-def normalize_string(s):
-    return ''.join(c for c in unicodedata.normalize('NFD', s)
-                  if unicodedata.category(c) != 'Mn').lower()
-
-def is_match(name1, name2):
-    n1 = normalize_string(name1)
-    n2 = normalize_string(name2)
-    
-    if n1 == n2:
-        return True
-    if len(n1) > 3 and n1 in n2:
-        return True
-    if len(n2) > 3 and n2 in n1:
-        return True
-    return False
+import archive
+import chunks
+import db
+import matching
+import moments
+import rollup
+import runlength
+import schema
+import stats
+import timejoin
 
+@db.cached
 def get_shared_parkings():
     """Retourne une liste de dictionnaires pour les parkings qui ont à la fois des voitures et des vélos."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    car_parkings = []
-    bike_parkings = []
-    
     try:
-        cursor.execute("SELECT DISTINCT name FROM car_parking ORDER BY name")
-        car_parkings = [row[0] for row in cursor.fetchall()]
-        
-        cursor.execute("SELECT DISTINCT address FROM bike_parking ORDER BY address")
-        bike_parkings = [row[0] for row in cursor.fetchall()]
+        pairs = matching.get_matches(db.reader())
     except sqlite3.OperationalError:
         print("Erreur: Impossible de lire la base de données. Assurez-vous qu'elle existe.")
-        conn.close()
         return []
-        
-    conn.close()
-    
-    shared_parkings = []
-    used_bikes = set()
     
-    for car_name in car_parkings:
-        for bike_name in bike_parkings:
-            if bike_name in used_bikes:
-                continue
-                
-            if is_match(car_name, bike_name):
-                shared_parkings.append({
-                    'display_name': car_name, 
-                    'car_name': car_name,
-                    'bike_name': bike_name
-                })
-                used_bikes.add(bike_name)
-                break
-    
-    return shared_parkings
+    return [{'display_name': car_name, 'car_name': car_name, 'bike_name': bike_name}
+            for car_name, bike_name in pairs]
 
 # --- Fonctions d'analyse statistique ---
 
 def calculate_mean(data):
-    if not data:
-        return 0.0
-    return sum(data) / len(data)
+    return stats.mean(data)
 
 def calculate_correlation(x, y):
     """Calcule le coefficient de corrélation de Pearson entre deux listes."""
     if len(x) != len(y) or len(x) < 2:
         return 0.0
+    return stats.correlation(x, y)
 
-    n = len(x)
-    mean_x = calculate_mean(x)
-    mean_y = calculate_mean(y)
+PAIRED_TYPES = (float, float, float, float)  # dispo voiture, total voiture, dispo vélo, total vélo
 
-    numerator = sum((xi - mean_x) * (yi - mean_y) for xi, yi in zip(x, y))
-    
-    sum_sq_diff_x = sum((xi - mean_x) ** 2 for xi in x)
-    sum_sq_diff_y = sum((yi - mean_y) ** 2 for yi in y)
-    
-    denominator = math.sqrt(sum_sq_diff_x) * math.sqrt(sum_sq_diff_y)
-    
-    if denominator == 0:
-        return 0.0
-        
-    return numerator / denominator
+def valid_columns(columns):
+    """Garde les lignes où les deux disponibilités sont connues."""
+    car_avail, car_total, bike_avail, bike_total = columns
+    # Parfois les requêtes peuvent échouer et retourner None, filtrer les données valides
+    valid = ~np.isnan(car_avail) & ~np.isnan(bike_avail)
+    return car_avail[valid], car_total[valid], bike_avail[valid], bike_total[valid]
+
+def paired_chunks(car_name, bike_name, tolerance=timejoin.TOLERANCE, bucket=None, size=chunks.CHUNK_SIZE):
+    """Séries appariées d'un parking par tranches d'au plus size lignes : (car_avail, car_total, bike_avail, bike_total)."""
+    conn = db.reader()
+
+    # Deux lectures ordonnées par temps (archive puis base), appariées à la volée : chaque relevé voiture
+    # est associé au dernier relevé vélo pris au plus tolerance secondes avant (ou par tranches de bucket secondes)
+    car_rows = archive.series_rows(conn, 'car', car_name, ('available', 'total'), group=0)
+    bike_rows = archive.series_rows(conn, 'bike', bike_name, ('available', 'total'), group=0)
+
+    rows = (r[2:] for r in timejoin.join(car_rows, bike_rows, tolerance, bucket))
+    for columns in chunks.column_chunks(rows, PAIRED_TYPES, size):
+        yield valid_columns(columns)
+
+@db.cached
+def get_paired_data(car_name, bike_name, tolerance=timejoin.TOLERANCE, bucket=None):
+    # Tableaux remplis tranche par tranche, sans liste intermédiaire de tuples
+    return chunks.collect(paired_chunks(car_name, bike_name, tolerance, bucket), PAIRED_TYPES)
+
+def _cold_rows(conn, kind, parkings, key):
+    for i, parking in enumerate(parkings):
+        for row in archive.cold_rows(conn, kind, parking[key], ('available', 'total')):
+            yield (i,) + row
 
-def get_paired_data(car_name, bike_name):
-    conn = sqlite3.connect(DB_NAME)
+def get_all_paired_data(parkings, tolerance=timejoin.TOLERANCE, bucket=None):
+    """Lit en une passe par table les séries appariées de tous les parkings.
+
+    Retourne une liste alignée sur parkings de tuples (car_avail, car_total, bike_avail, bike_total).
+    """
+    conn = db.reader()
     cursor = conn.cursor()
-    
-    # Nous joignons sur le timestamp pour nous assurer de comparer le moment exact
-    query = """
-        SELECT 
-            c.availableSpotNumber, 
-            c.totalSpotNumber,
-            b.availableBikeNumber, 
-            b.totalSlotNumber,
-            c.timestamp
-        FROM car_parking c
-        JOIN bike_parking b ON c.timestamp = b.timestamp
-        WHERE c.name = ? AND b.address = ?
-        ORDER BY c.timestamp
+
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS pairs (idx INTEGER PRIMARY KEY, car_name TEXT, bike_name TEXT)")
+    cursor.execute("DELETE FROM pairs")
+    cursor.executemany("INSERT INTO pairs VALUES (?, ?, ?)",
+                       [(i, p['car_name'], p['bike_name']) for i, p in enumerate(parkings)])
+
+    car_rows = conn.execute(f"""
+        SELECT p.idx, c.ts, c.available, c.total
+        FROM pairs p
+        JOIN station s ON s.kind = 'car' AND s.name = p.car_name
+        JOIN {runlength.sample_table(conn, 'car')} c ON c.station_key = s.station_key
+        ORDER BY p.idx, c.ts
+    """)
+    bike_rows = conn.execute(f"""
+        SELECT p.idx, b.ts, b.available, b.total
+        FROM pairs p
+        JOIN station s ON s.kind = 'bike' AND s.name = p.bike_name
+        JOIN {runlength.sample_table(conn, 'bike')} b ON b.station_key = s.station_key
+        ORDER BY p.idx, b.ts
+    """)
+    if archive.get_horizon(conn):
+        # Jours archivés : lus parking par parking puis fusionnés dans l'ordre (idx, ts)
+        car_rows = archive.merge_groups(_cold_rows(conn, 'car', parkings, 'car_name'), car_rows)
+        bike_rows = archive.merge_groups(_cold_rows(conn, 'bike', parkings, 'bike_name'), bike_rows)
+    rows = ((r[0],) + r[2:] for r in timejoin.join(car_rows, bike_rows, tolerance, bucket))
+    types = (np.int64,) + PAIRED_TYPES
+    index, *columns = chunks.collect(chunks.column_chunks(rows, types), types)
+
+    # Découpage en mémoire : les lignes sont triées par parking
+    bounds = np.searchsorted(index, np.arange(len(parkings) + 1))
+    return [valid_columns([column[start:end] for column in columns]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+def format_analysis(parking, paired_data=None, tolerance=timejoin.TOLERANCE, bucket=None, stream=False):
+    """Construit le rapport texte d'un parking (le même texte en série ou en parallèle).
+
+    Avec stream, les séries sont lues et résumées tranche par tranche, en mémoire bornée.
     """
+    out = io.StringIO()
+    print(f"\n{'='*20} Analyse : {parking['display_name']} {'='*20}", file=out)
     
-    cursor.execute(query, (car_name, bike_name))
-    rows = cursor.fetchall()
-    conn.close()
-    
-    # Décompression dans des listes
-    car_avail = []
-    car_total = []
-    bike_avail = []
-    bike_total = []
-    
-    for r in rows:
-        # Parfois les requêtes peuvent échouer et retourner None, filtrer les données valides
-        if r[0] is not None and r[2] is not None:
-            car_avail.append(r[0])
-            car_total.append(r[1])
-            bike_avail.append(r[2])
-            bike_total.append(r[3])
-            
-    return car_avail, car_total, bike_avail, bike_total
-
-def analyze_parking(parking):
-    print(f"\n{'='*20} Analyse : {parking['display_name']} {'='*20}")
-    
-    car_avail, car_total, bike_avail, bike_total = get_paired_data(parking['car_name'], parking['bike_name'])
+    if stream and paired_data is None:
+        paired = paired_chunks(parking['car_name'], parking['bike_name'], tolerance, bucket)
+        count, means, correlation = stats.chunked_summary(paired, 0, 2)
+        avg_car, mean_car_capacity, avg_bike, mean_bike_capacity = means or (0.0,) * 4
+    else:
+        if paired_data is None:
+            paired_data = get_paired_data(parking['car_name'], parking['bike_name'], tolerance, bucket)
+        car_avail, car_total, bike_avail, bike_total = paired_data
+        count = len(car_avail)
+
+        # Statistiques basiques
+        avg_car = calculate_mean(car_avail)
+        avg_bike = calculate_mean(bike_avail)
+        mean_car_capacity = calculate_mean(car_total)
+        mean_bike_capacity = calculate_mean(bike_total)
+        correlation = calculate_correlation(car_avail, bike_avail)
     
-    count = len(car_avail)
     if count < 2:
-        print("Pas assez de données pour calculer les statistiques.")
-        return
+        print("Pas assez de données pour calculer les statistiques.", file=out)
+        return out.getvalue()
 
-    # Statistiques basiques
-    avg_car = calculate_mean(car_avail)
-    avg_bike = calculate_mean(bike_avail)
-    
     # Calcul de l'occupation (Occupation = 1 - (Disponible / Total))
-    mean_car_capacity = calculate_mean(car_total)
-    mean_bike_capacity = calculate_mean(bike_total)
     
     car_occupancy_pct = (1 - (avg_car / mean_car_capacity)) * 100 if mean_car_capacity > 0 else 0
     bike_occupancy_pct = (1 - (avg_bike / mean_bike_capacity)) * 100 if mean_bike_capacity > 0 else 0
 
-    print(f"Points de données analysés : {count}")
-    print(f"Dispo Voiture Moy : {avg_car:.1f} / {mean_car_capacity:.0f} places")
-    print(f"Occupation Voiture: {car_occupancy_pct:.1f}%")
-    print(f"Dispo Vélo Moy :    {avg_bike:.1f} / {mean_bike_capacity:.0f} vélos")
-    print(f"Occupation Vélo :   {bike_occupancy_pct:.1f}%")
+    print(f"Points de données analysés : {count}", file=out)
+    print(f"Dispo Voiture Moy : {avg_car:.1f} / {mean_car_capacity:.0f} places", file=out)
+    print(f"Occupation Voiture: {car_occupancy_pct:.1f}%", file=out)
+    print(f"Dispo Vélo Moy :    {avg_bike:.1f} / {mean_bike_capacity:.0f} vélos", file=out)
+    print(f"Occupation Vélo :   {bike_occupancy_pct:.1f}%", file=out)
 
     # Corrélation
-    correlation = calculate_correlation(car_avail, bike_avail)
-    
-    print(f"\nCorrélation entre dispo Voiture et Vélo : {correlation:.4f}")
+    print(f"\nCorrélation entre dispo Voiture et Vélo : {correlation:.4f}", file=out)
     
     interpretation = ""
     if abs(correlation) < 0.1:
@@ -172,12 +167,12 @@ def analyze_parking(parking):
     direction = "positive" if correlation > 0 else "négative"
     
     if abs(correlation) >= 0.1:
-        print(f"-> Cela signifie qu'il y a une {interpretation} ({direction}).")
+        print(f"-> Cela signifie qu'il y a une {interpretation} ({direction}).", file=out)
     else:
-        print(f"-> {interpretation}")
+        print(f"-> {interpretation}", file=out)
 
     # Analyse Parc Relais (Intermodalité)
-    print("\n--- Analyse 'Parc Relais' ---")
+    print("\n--- Analyse 'Parc Relais' ---", file=out)
     
     # Pour un Parc Relais, on s'attend à ce que quand les gens garent leur voiture (Dispo Voiture Baisse),
     # ils prennent un vélo (Dispo Vélo Baisse).
@@ -185,15 +180,298 @@ def analyze_parking(parking):
     # C'est une corrélation POSITIVE.
     
     if correlation > 0.3:
-        print("✅ POSITIF : Cela ressemble à un Parc Relais qui fonctionne.")
-        print("   (Les disponibilités varient ensemble : Voitures garées = Vélos empruntés).")
+        print("✅ POSITIF : Cela ressemble à un Parc Relais qui fonctionne.", file=out)
+        print("   (Les disponibilités varient ensemble : Voitures garées = Vélos empruntés).", file=out)
     elif correlation < -0.3:
-        print("❌ NEGATIF : Ne semble pas fonctionner comme un relais Car->Vélo.")
-        print("   (Le compotement est inversé: Parking plein = Station vélo pleine).")
+        print("❌ NEGATIF : Ne semble pas fonctionner comme un relais Car->Vélo.", file=out)
+        print("   (Le compotement est inversé: Parking plein = Station vélo pleine).", file=out)
+    else:
+        print("❓ NEUTRE : Pas de lien évident détecté pour l'instant.", file=out)
+
+    return out.getvalue()
+
+def hourly_profile(conn, kind, name):
+    """Disponibilité moyenne et taux d'occupation par heure de la journée (0-23), lus dans les agrégats horaires."""
+    avail_sum = np.zeros(24)
+    avail_n = np.zeros(24)
+    cap_sum = np.zeros(24)
+    cap_n = np.zeros(24)
+    for bucket, n, n_avail, low, high, total, total_sq, n_cap, sum_cap in rollup.aggregate(conn, kind, name, 'hour'):
+        hour = time.localtime(bucket).tm_hour
+        avail_sum[hour] += total
+        avail_n[hour] += n_avail
+        cap_sum[hour] += sum_cap
+        cap_n[hour] += n_cap
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_avail = avail_sum / avail_n
+        occupancy = (1 - mean_avail / (cap_sum / cap_n)) * 100
+    return mean_avail, occupancy
+
+def format_profile(parking, conn):
+    out = io.StringIO()
+    print(f"\n{'='*20} Profil horaire : {parking['display_name']} {'='*20}", file=out)
+    car_avail, car_occupancy = hourly_profile(conn, 'car', parking['car_name'])
+    bike_avail, bike_occupancy = hourly_profile(conn, 'bike', parking['bike_name'])
+    print("Heure | Dispo Voiture | Occup. Voiture | Dispo Vélo | Occup. Vélo", file=out)
+    for hour in range(24):
+        if np.isnan(car_avail[hour]) and np.isnan(bike_avail[hour]):
+            continue
+        print(f"{hour:02d}h   | {car_avail[hour]:13.1f} | {car_occupancy[hour]:13.1f}% "
+              f"| {bike_avail[hour]:10.1f} | {bike_occupancy[hour]:10.1f}%", file=out)
+    return out.getvalue()
+
+WINDOWS = [("24h", 24 * 3600), ("7j", 7 * 24 * 3600), ("Total", None)]
+
+def occupancy(mean_available, capacity):
+    """Taux d'occupation en % (1 - disponible / capacité), None sans capacité connue."""
+    return (1 - mean_available / capacity) * 100 if capacity else None
+
+def format_online(parking, conn):
+    """Corrélations et occupation lues dans les états incrémentaux du scraper (moments et agrégats
+    horaires), sans relire les relevés."""
+    out = io.StringIO()
+    print(f"\n{'='*20} Corrélations en continu : {parking['display_name']} {'='*20}", file=out)
+    for label, seconds in WINDOWS:
+        state = moments.window_state(conn, parking['car_name'], parking['bike_name'], seconds)
+        n, mean_car, mean_bike = state[0], state[1], state[2]
+        if n < 2:
+            print(f"{label:>5} : pas assez de données", file=out)
+            continue
+        print(f"{label:>5} : corrélation {moments.correlation(state):+.4f} sur {n} points "
+              f"(dispo moy. voiture {mean_car:.1f}, vélo {mean_bike:.1f})", file=out)
+        car_occupancy = occupancy(mean_car, rollup.mean_capacity(conn, 'car', parking['car_name'], seconds))
+        bike_occupancy = occupancy(mean_bike, rollup.mean_capacity(conn, 'bike', parking['bike_name'], seconds))
+        print(f"{'':>5}   occupation voiture {'?' if car_occupancy is None else f'{car_occupancy:.1f}%'}, "
+              f"vélo {'?' if bike_occupancy is None else f'{bike_occupancy:.1f}%'}", file=out)
+    return out.getvalue()
+
+# --- Corrélation décalée (--lags) ---
+
+STEP = 60        # secondes entre deux points de la grille
+MAX_GAP = 600    # les trous plus courts (en secondes) sont interpolés
+
+def get_lagged_series(parkings, step=STEP, max_gap=MAX_GAP):
+    """Disponibilités voiture et vélo de tous les parkings sur une grille commune de step secondes.
+
+    Retourne (cars, bikes), deux tableaux (parkings, points) ; NaN là où il manque des relevés
+    après interpolation des trous d'au plus max_gap secondes.
+    """
+    conn = db.reader()
+    series = []
+    for parking in parkings:
+        for kind, key in (('car', 'car_name'), ('bike', 'bike_name')):
+            rows = archive.series_rows(conn, kind, parking[key], ('available',))
+            series.append(np.array(list(rows), dtype=float).reshape(-1, 2))
+    stamps = [rows[:, 0] for rows in series if len(rows)]
+    if not stamps:
+        return np.empty((len(parkings), 0)), np.empty((len(parkings), 0))
+    start = int(min(ts.min() for ts in stamps))
+    start -= start % step
+    size = (int(max(ts.max() for ts in stamps)) - start) // step + 1
+    grid = np.vstack([stats.resample(rows[:, 0], rows[:, 1], start, step, size) for rows in series])
+    grid = stats.fill_gaps(grid, max_gap // step)
+    return grid[0::2], grid[1::2]
+
+def format_lags(parking, lags, corr, step=STEP):
+    """Rapport de la corrélation entre la voiture à t et le vélo à t + décalage."""
+    out = io.StringIO()
+    print(f"\n{'='*20} Corrélation décalée : {parking['display_name']} {'='*20}", file=out)
+    if not corr.any():
+        print("Pas assez de données pour calculer les statistiques.", file=out)
+        return out.getvalue()
+    minutes = lags * step / 60
+    lag, peak = stats.peak_lag(lags, corr)
+    print(f"Décalages de {minutes[0]:+.0f} à {minutes[-1]:+.0f} min, par pas de {step} s", file=out)
+    print(f"Sans décalage : {corr[lags == 0][0]:+.4f}", file=out)
+    delay = lag * step / 60
+    if lag == 0:
+        print(f"Pic : {peak:+.4f} sans décalage", file=out)
+    else:
+        side = "après" if lag > 0 else "avant"
+        print(f"Pic : {peak:+.4f} avec le vélo {abs(delay):.0f} min {side} la voiture", file=out)
+
+    # Un Parc Relais : le conducteur se gare, puis prend un vélo quelques minutes plus tard
+    if peak > 0.3 and lag > 0:
+        print(f"✅ Les vélos suivent les voitures d'environ {delay:.0f} min (effet Parc Relais différé).", file=out)
+    elif peak > 0.3:
+        print("❓ Lien positif, mais les vélos ne réagissent pas après les voitures.", file=out)
+    elif peak < -0.3:
+        print("❌ Lien inversé, quel que soit le décalage.", file=out)
     else:
-        print("❓ NEUTRE : Pas de lien évident détecté pour l'instant.")
+        print("❓ Pas de lien évident, quel que soit le décalage.", file=out)
+    return out.getvalue()
+
+def analyze_lags(parkings, max_lag, step=STEP, max_gap=MAX_GAP):
+    """Corrélation décalée de tous les parkings, de -max_lag à +max_lag secondes, en un seul calcul FFT."""
+    cars, bikes = get_lagged_series(parkings, step, max_gap)
+    lags, corr = stats.cross_correlation(cars, bikes, max(1, int(max_lag // step)))
+    for parking, row in zip(parkings, corr):
+        print(format_lags(parking, lags, row, step), end='')
+
+# --- Matrice de corrélation de tout le réseau (--network) ---
+
+BLOCK_DAYS = 7   # jours de relevés en mémoire à la fois
+TOP_K = 5
+
+def network_stations(conn):
+    """Noms des parkings voiture puis des stations vélo, et par type (station_key triées, ligne de la matrice)."""
+    names = []
+    rows = {}
+    for kind in ('car', 'bike'):
+        stations = conn.execute("SELECT station_key, name FROM station WHERE kind = ? ORDER BY name, station_key",
+                                (kind,)).fetchall()
+        keys, index = [], []
+        for key, name in stations:
+            # Plusieurs station_key peuvent porter le même nom : une seule série
+            if not names or names[-1] != (kind, name):
+                names.append((kind, name))
+            keys.append(key)
+            index.append(len(names) - 1)
+        order = np.argsort(keys)
+        rows[kind] = (np.array(keys, dtype=np.int64)[order], np.array(index, dtype=np.int64)[order])
+    return names, rows
+
+def network_extent(conn):
+    """Premier et dernier relevé, toutes tables et archive confondues."""
+    first, last = conn.execute("SELECT MIN(ts), MAX(ts) FROM tick").fetchone()
+    for kind in ('car', 'bike'):
+        cold_first, cold_last = archive.extent(kind)
+        if cold_first is not None:
+            first = cold_first if first is None else min(first, cold_first)
+            last = cold_last if last is None else max(last, cold_last)
+    return first, last
+
+def network_blocks(conn, rows, count, step=STEP, block_days=BLOCK_DAYS):
+    """Tranches (stations, points) de la grille commune de step secondes, block_days jours à la fois."""
+    first, last = network_extent(conn)
+    if first is None:
+        return
+    start = first - first % step
+    width = max(1, block_days * 86400 // step) * step
+    for block_start in range(start, last + 1, width):
+        size = width // step
+        sums = np.zeros(count * size)
+        counts = np.zeros(count * size)
+        for kind in ('car', 'bike'):
+            sorted_keys, station_rows = rows[kind]
+            for keys, ts, available in archive.block_chunks(conn, kind, ('available',),
+                                                            block_start, block_start + width):
+                valid = np.isfinite(available)
+                # Ligne de chaque relevé par recherche dans les clés triées, sans dictionnaire par ligne
+                index = station_rows[np.searchsorted(sorted_keys, keys[valid])]
+                cells = index * size + (ts[valid] - block_start) // step
+                sums += np.bincount(cells, weights=available[valid], minlength=count * size)
+                counts += np.bincount(cells, minlength=count * size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            yield (sums / counts).reshape(count, size)
+
+def top_related(names, corr, counts, k=TOP_K, min_points=2):
+    """Pour chaque parking voiture, les k stations vélo puis les k autres parkings les plus corrélés
+    (en valeur absolue).
+
+    Retourne des lignes (parking, type, rang, station, corrélation, points communs).
+    """
+    kinds = np.array([kind for kind, _ in names])
+    result = []
+    for i, (kind, name) in enumerate(names):
+        if kind != 'car':
+            continue
+        for other in ('bike', 'car'):
+            candidates = (kinds == other) & (counts[i] >= min_points) & (np.arange(len(names)) != i)
+            scores = np.where(candidates, np.abs(corr[i]), -1)
+            best = [j for j in np.argsort(-scores, kind='stable')[:k] if scores[j] >= 0]
+            for rank, j in enumerate(best, 1):
+                result.append((name, other, rank, names[j][1], float(corr[i, j]), int(counts[i, j])))
+    return result
+
+def heatmap(names, corr):
+    """Dessine la matrice avec plotting.heatmap_correlations (partagée avec DM1)."""
+    import plotting
+    labels = [f"{'Voiture' if kind == 'car' else 'Vélo'} {name}" for kind, name in names]
+    plotting.heatmap_correlations(None, labels, corr)
+
+def analyze_network(step=STEP, block_days=BLOCK_DAYS, k=TOP_K, export=None, draw=False):
+    conn = db.reader()
+    names, rows = network_stations(conn)
+    corr, counts = stats.blockwise_correlation_matrix(network_blocks(conn, rows, len(names), step, block_days))
+    if not len(corr):
+        print("Pas assez de données pour calculer les statistiques.")
+        return
+    cars = sum(1 for kind, _ in names if kind == 'car')
+    print(f"\nMatrice {len(names)} x {len(names)} ({cars} parkings, {len(names) - cars} stations vélo), "
+          f"grille de {step} s, par tranches de {block_days} jours")
+
+    related = top_related(names, corr, counts, k)
+    current = None
+    for parking, kind, rank, station, r, n in related:
+        if parking != current:
+            print(f"\n{'='*20} Stations liées : {parking} {'='*20}")
+            current = parking
+        print(f"{rank}. {'Voiture' if kind == 'car' else 'Vélo':<7} {station:<40} {r:+.4f} ({n} points)")
+
+    if export:
+        import csv
+        with open(export, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['parking', 'type', 'rang', 'station', 'correlation', 'points'])
+            writer.writerows(related)
+        print(f"\n{len(related)} lignes exportées dans {export}")
+    if draw:
+        heatmap(names, corr)
+
+def analyze_parking(parking, paired_data=None, tolerance=timejoin.TOLERANCE, bucket=None, stream=False):
+    print(format_analysis(parking, paired_data, tolerance, bucket, stream), end='')
+
+# --- Analyse parallèle (--jobs N) ---
+
+def _analyze_in_worker(parking, tolerance, bucket, stream=False):
+    # Chaque processus ouvre sa propre connexion en lecture seule (db.reader)
+    return format_analysis(parking, tolerance=tolerance, bucket=bucket, stream=stream)
+
+def analyze_parallel(parkings, jobs, tolerance=timejoin.TOLERANCE, bucket=None, stream=False):
+    """Répartit les analyses sur jobs processus ; les rapports sont rendus dans l'ordre de parkings."""
+    worker = functools.partial(_analyze_in_worker, tolerance=tolerance, bucket=bucket, stream=stream)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for report in executor.map(worker, parkings):
+            print(report, end='')
 
 def main():
+    parser = argparse.ArgumentParser(description="Analyse des parkings partagés voiture / vélo.")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="nombre de processus pour les analyses (défaut : 1, en série)")
+    parser.add_argument('--tolerance', type=int, default=timejoin.TOLERANCE,
+                        help=f"écart max. en secondes entre relevés voiture et vélo appariés (défaut : {timejoin.TOLERANCE})")
+    parser.add_argument('--bucket', type=int, default=None,
+                        help="apparier par tranches fixes de BUCKET secondes au lieu du relevé précédent")
+    parser.add_argument('--online', action='store_true',
+                        help="corrélations 24h / 7 jours / totale depuis les états incrémentaux, sans relire l'historique")
+    parser.add_argument('--profile', action='store_true',
+                        help="afficher l'occupation moyenne par heure de la journée (agrégats horaires)")
+    parser.add_argument('--lags', type=float, default=None, metavar='MINUTES',
+                        help="corrélation décalée par FFT, pour des décalages de -MINUTES à +MINUTES")
+    parser.add_argument('--step', type=int, default=STEP,
+                        help=f"pas en secondes de la grille ré-échantillonnée de --lags (défaut : {STEP})")
+    parser.add_argument('--max-gap', type=int, default=MAX_GAP,
+                        help=f"durée max. en secondes des trous interpolés pour --lags (défaut : {MAX_GAP})")
+    parser.add_argument('--stream', action='store_true',
+                        help="lire et résumer chaque parking par tranches, en mémoire bornée")
+    parser.add_argument('--network', action='store_true',
+                        help="matrice de corrélation de tous les parkings et stations vélo, sur la grille de --step")
+    parser.add_argument('--block-days', type=int, default=BLOCK_DAYS,
+                        help=f"jours de relevés en mémoire à la fois pour --network (défaut : {BLOCK_DAYS})")
+    parser.add_argument('--top', type=int, default=TOP_K,
+                        help=f"stations liées affichées par parking pour --network (défaut : {TOP_K})")
+    parser.add_argument('--export', default=None, metavar='FICHIER.csv',
+                        help="exporter les stations liées de --network en CSV")
+    parser.add_argument('--heatmap', action='store_true',
+                        help="dessiner la matrice de --network avec plotting.heatmap_correlations")
+    args = parser.parse_args()
+
+    schema.upgrade_db(db.DB_NAME)
+    if args.network:
+        analyze_network(args.step, args.block_days, args.top, args.export, args.heatmap)
+        return
+
     print("Recherche des parkings partagés (Voiture & Vélo)...")
     shared = get_shared_parkings()
     
@@ -203,8 +481,30 @@ def main():
         
     print(f"{len(shared)} lieux partagés trouvés.")
     
-    for parking in shared:
-        analyze_parking(parking)
+    if args.profile or args.online:
+        report = format_profile if args.profile else format_online
+        for parking in shared:
+            print(report(parking, db.reader()), end='')
+        return
+
+    if args.lags is not None:
+        analyze_lags(shared, args.lags * 60, args.step, args.max_gap)
+        return
+
+    if args.jobs > 1:
+        analyze_parallel(shared, args.jobs, args.tolerance, args.bucket, args.stream)
+        return
+
+    if args.stream:
+        # Un parking à la fois, chacun lu par tranches : la mémoire ne dépend pas de l'historique
+        for parking in shared:
+            analyze_parking(parking, tolerance=args.tolerance, bucket=args.bucket, stream=True)
+        return
+
+    # Une seule lecture de la base pour tous les parkings
+    all_paired_data = get_all_paired_data(shared, args.tolerance, args.bucket)
+    for parking, paired_data in zip(shared, all_paired_data):
+        analyze_parking(parking, paired_data)
 
 if __name__ == "__main__":
     main()
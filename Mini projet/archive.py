@@ -0,0 +1,317 @@
+import argparse
+import heapq
+import itertools
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+import numpy as np
+
+import chunks
+import db
+import rollup
+import runlength
+
+# Columnar cold storage for closed days.
+#
+# Samples older than the archive horizon (a local midnight, stored in meta) are moved out of
+# car_sample / bike_sample into one directory per kind and day, one .npy file per column:
+#
+#     archive/car/2026-01-12/station_key.npy, ts.npy, available.npy, total.npy, status.npy
+#     archive/car/2026-01-12/stations.npy, offsets.npy   (rows of stations[i] are offsets[i]:offsets[i + 1])
+#     archive/car/2026-01-12/status_values.npy            (status.npy holds indexes into it)
+#
+# Rows are sorted by (station_key, ts), so a station's samples are one contiguous slice of
+# each memory-mapped column. Rollups and pair moments stay in SQLite and keep covering
+# archived days. series_rows() reads archived and live samples as one ordered stream.
+
+ARCHIVE_DIR = "archive"
+
+COLUMNS = {
+    'car': ('available', 'total', 'status'),
+    'bike': ('available', 'free', 'total', 'status'),
+}
+DTYPES = {'available': np.float32, 'free': np.float32, 'total': np.float32}  # NaN for NULL
+
+def get_horizon(conn):
+    """Samples before this epoch are in the archive (0 if nothing was archived)."""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'archive_horizon'").fetchone()
+    return int(row[0]) if row else 0
+
+def _day_dir(kind, day):
+    return os.path.join(ARCHIVE_DIR, kind, datetime.fromtimestamp(day).strftime('%Y-%m-%d'))
+
+def _write_day(kind, day, rows):
+    """Writes one day of (station_key, ts, *columns) rows sorted by (station_key, ts)."""
+    target = _day_dir(kind, day)
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = list(zip(*rows))
+    keys = np.array(columns[0], dtype=np.int64)
+    np.save(os.path.join(tmp, "station_key.npy"), keys)
+    np.save(os.path.join(tmp, "ts.npy"), np.array(columns[1], dtype=np.int64))
+    for name, values in zip(COLUMNS[kind], columns[2:]):
+        if name == 'status':
+            # Few distinct values: dictionary-encoded
+            dictionary, array = np.unique(np.array([v or '' for v in values], dtype=str), return_inverse=True)
+            np.save(os.path.join(tmp, "status_values.npy"), dictionary)
+            array = array.astype(np.int16)
+        else:
+            array = np.array(values, dtype=float).astype(DTYPES[name])
+        np.save(os.path.join(tmp, f"{name}.npy"), array)
+
+    stations, offsets = np.unique(keys, return_index=True)
+    np.save(os.path.join(tmp, "stations.npy"), stations)
+    np.save(os.path.join(tmp, "offsets.npy"), np.append(offsets, len(keys)))
+
+    # A day is visible only once complete
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+def archive_closed_days(conn, keep_days=0):
+    """Moves the samples of every closed day older than keep_days out of SQLite. Returns the new horizon."""
+    horizon = rollup.day_start(int(time.time()))
+    for _ in range(keep_days):
+        horizon = rollup.day_start(horizon - 1)
+    if horizon <= get_horizon(conn):
+        return get_horizon(conn)
+
+    for kind, table in rollup.SAMPLE_TABLES.items():
+        columns = ", ".join(COLUMNS[kind])
+        first = conn.execute(f"SELECT MIN(ts) FROM {table}").fetchone()[0]
+        if first is None:
+            continue
+        # Change-only rows are expanded to one row per tick: archived days are always complete
+        source = runlength.sample_table(conn, kind)
+        day = rollup.day_start(first)
+        while day < horizon:
+            next_day = rollup.day_start(day + 86400 + 7200)  # +2h absorbs DST days of 23 or 25 hours
+            rows = conn.execute(f'''
+                SELECT station_key, ts, {columns} FROM {source}
+                WHERE ts >= ? AND ts < ?
+                ORDER BY station_key, ts
+            ''', (day, next_day)).fetchall()
+            if rows:
+                if os.path.isdir(_day_dir(kind, day)):
+                    # Day partly archived by an earlier run (e.g. late rows): merge with it
+                    old = _read_day(kind, day, None, (None, None), COLUMNS[kind], with_keys=True)
+                    rows = sorted(set(_as_rows(old)) | set(rows))
+                _write_day(kind, day, rows)
+            day = next_day
+
+    # Files are in place: drop the rows and move the horizon in one transaction
+    with conn:
+        if runlength.is_change_only(conn):
+            # The runs still open at horizon must not lose their first row
+            runlength.carry_forward(conn.cursor(), horizon)
+        for table in rollup.SAMPLE_TABLES.values():
+            conn.execute(f"DELETE FROM {table} WHERE ts < ?", (horizon,))
+        conn.execute("DELETE FROM tick WHERE ts < ?", (horizon,))
+        conn.execute("DELETE FROM absence WHERE ts < ?", (horizon,))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('archive_horizon', ?)", (str(horizon),))
+    return horizon
+
+# --- Reading ---
+
+def _days(kind, start, end):
+    """Archived day directories of kind overlapping [start, end), in time order (partition pruning)."""
+    base = os.path.join(ARCHIVE_DIR, kind)
+    if not os.path.isdir(base):
+        return []
+    days = []
+    for name in sorted(os.listdir(base)):
+        if name.endswith(".tmp"):
+            continue
+        day = int(time.mktime(time.strptime(name, '%Y-%m-%d')))
+        if end is not None and day >= end:
+            break
+        if start is not None and rollup.day_start(day + 86400 + 7200) <= start:
+            continue
+        days.append(day)
+    return days
+
+def _read_day(kind, day, station_keys, time_range, columns, with_keys=False):
+    """Arrays (ts, *columns) of the given stations in one archived day, ordered by ts; None if empty.
+
+    Only the station slices and the requested columns are read, through memory maps. Counts stay
+    float with NaN for NULL, status is decoded to strings ('' for NULL). With with_keys, the
+    arrays are (station_key, ts, *columns) ordered by (station_key, ts).
+    """
+    path = _day_dir(kind, day)
+    stations = np.load(os.path.join(path, "stations.npy"))
+    offsets = np.load(os.path.join(path, "offsets.npy"))
+    if station_keys is None:
+        slices = list(zip(offsets[:-1], offsets[1:]))
+    else:
+        positions = np.searchsorted(stations, station_keys)
+        slices = [(offsets[p], offsets[p + 1]) for p, key in zip(positions, station_keys)
+                  if p < len(stations) and stations[p] == key]
+    if not slices:
+        return None
+
+    names = (['station_key'] if with_keys else []) + ['ts'] + list(columns)
+    mapped = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in names}
+    index = np.concatenate([np.arange(a, b) for a, b in slices])
+    ts = mapped['ts'][index]
+    keep = np.ones(len(index), dtype=bool)
+    start, end = time_range
+    if start is not None:
+        keep &= ts >= start
+    if end is not None:
+        keep &= ts < end
+    index = index[keep]
+    if not with_keys:
+        index = index[np.argsort(mapped['ts'][index], kind='stable')]
+
+    arrays = []
+    for name in names:
+        column = np.asarray(mapped[name][index])
+        if name == 'status':
+            column = np.load(os.path.join(path, "status_values.npy"))[column]
+        arrays.append(column)
+    return tuple(arrays)
+
+def _as_rows(arrays):
+    """Rows of the arrays of _read_day() as SQLite returns them: counts as int, NaN and '' as None."""
+    values = []
+    for column in arrays:
+        if column.dtype.kind == 'f':
+            values.append([None if v != v else int(v) for v in column.tolist()])
+        elif column.dtype.kind == 'U':
+            values.append([v or None for v in column.tolist()])
+        else:
+            values.append(column.tolist())
+    return zip(*values)
+
+def _station_keys(conn, kind, name):
+    rows = conn.execute("SELECT station_key FROM station WHERE kind = ? AND name = ? ORDER BY station_key",
+                        (kind, name)).fetchall()
+    return [row[0] for row in rows]
+
+def cold_rows(conn, kind, name, columns=('available',), start=None, end=None):
+    """Archived (ts, *columns) rows of one station, ordered by ts."""
+    keys = _station_keys(conn, kind, name)
+    if not keys:
+        return iter(())
+    days = (_read_day(kind, day, keys, (start, end), columns) for day in _days(kind, start, end))
+    return itertools.chain.from_iterable(_as_rows(arrays) for arrays in days if arrays is not None)
+
+def hot_rows(conn, kind, name, columns=('available',), start=None, end=None):
+    """(ts, *columns) rows of one station still in SQLite, ordered by ts."""
+    selected = ", ".join(f"x.{c}" for c in columns)
+    query = f'''
+        SELECT x.ts, {selected}
+        FROM station s
+        JOIN {runlength.sample_table(conn, kind)} x ON x.station_key = s.station_key
+        WHERE s.kind = ? AND s.name = ?
+    '''
+    params = [kind, name]
+    if start is not None:
+        query += " AND x.ts >= ?"
+        params.append(start)
+    if end is not None:
+        query += " AND x.ts < ?"
+        params.append(end)
+    return conn.execute(query + " ORDER BY x.ts", params)
+
+def series_rows(conn, kind, name, columns=('available',), start=None, end=None, group=None):
+    """Unified reader: (ts, *columns) rows of one station over [start, end), archive then SQLite.
+
+    With group, each row is prefixed with it, as timejoin expects.
+    """
+    horizon = get_horizon(conn)
+    parts = []
+    if horizon and (start is None or start < horizon):
+        parts.append(cold_rows(conn, kind, name, columns, start, horizon if end is None else min(end, horizon)))
+    if end is None or end > horizon:
+        parts.append(hot_rows(conn, kind, name, columns, start if start is None else max(start, horizon), end))
+    rows = itertools.chain.from_iterable(parts)
+    if group is not None:
+        rows = ((group,) + tuple(row) for row in rows)
+    return rows
+
+def block_chunks(conn, kind, columns=('available',), start=None, end=None):
+    """Arrays (station_key, ts, *columns) of every station of kind over [start, end), archive then SQLite.
+
+    One tuple per archived day, then per chunk of SQLite rows; counts are floats with NaN for NULL.
+    Unlike series_rows(), rows are not ordered: meant for filling a time grid of all stations.
+    """
+    horizon = get_horizon(conn)
+    if horizon and (start is None or start < horizon):
+        cold_end = horizon if end is None else min(end, horizon)
+        for day in _days(kind, start, cold_end):
+            arrays = _read_day(kind, day, None, (start, cold_end), columns, with_keys=True)
+            if arrays is not None:
+                yield arrays
+    if end is None or end > horizon:
+        selected = ", ".join(f"x.{c}" for c in columns)
+        query = f"SELECT x.station_key, x.ts, {selected} FROM {runlength.sample_table(conn, kind)} x WHERE x.ts >= ?"
+        params = [max(start or 0, horizon)]
+        if end is not None:
+            query += " AND x.ts < ?"
+            params.append(end)
+        dtypes = (np.int64, np.int64) + tuple(DTYPES.get(c, object) for c in columns)
+        yield from chunks.column_chunks(conn.execute(query, params), dtypes)
+
+LEGACY_VIEWS = {'car': 'car_parking', 'bike': 'bike_parking'}
+
+def legacy_rows(conn, kind):
+    """(column names, rows) of the car_parking / bike_parking compatibility view, archived days included.
+
+    The views only cover the samples still in SQLite; archived rows come first, in the same
+    layout (ngsi id, name, *COLUMNS[kind], local timestamp text).
+    """
+    stations = {key: (ngsi_id, name) for key, ngsi_id, name in
+                conn.execute("SELECT station_key, ngsi_id, name FROM station WHERE kind = ?", (kind,))}
+    hot = conn.execute(f"SELECT * FROM {LEGACY_VIEWS[kind]}")
+    columns = [d[0] for d in hot.description]
+
+    def rows():
+        horizon = get_horizon(conn)
+        for day in _days(kind, None, horizon) if horizon else []:
+            arrays = _read_day(kind, day, None, (None, horizon), COLUMNS[kind], with_keys=True)
+            if arrays is None:
+                continue
+            for key, ts, *values in _as_rows(arrays):
+                stamp = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+                yield stations[key] + tuple(values) + (stamp,)
+        yield from hot
+    return columns, rows()
+
+def merge_groups(cold, hot):
+    """Merges two streams of (group, ts, ...) rows, each ordered by (group, ts)."""
+    return heapq.merge(cold, hot, key=lambda row: (row[0], row[1]))
+
+def extent(kind):
+    """(first ts, last ts) of the archived samples of kind, (None, None) if there are none."""
+    days = _days(kind, None, None)
+    if not days:
+        return None, None
+    first = np.load(os.path.join(_day_dir(kind, days[0]), "ts.npy"), mmap_mode='r')
+    last = np.load(os.path.join(_day_dir(kind, days[-1]), "ts.npy"), mmap_mode='r')
+    return int(first.min()), int(last.max())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move closed days of samples to the columnar archive.")
+    parser.add_argument('--keep-days', type=int, default=0,
+                        help="closed days to keep in SQLite besides today (default: 0)")
+    parser.add_argument('--vacuum', action='store_true', help="shrink the database file afterwards")
+    args = parser.parse_args()
+
+    import schema
+    conn = sqlite3.connect(db.DB_NAME)
+    schema.migrate(conn)
+    horizon = archive_closed_days(conn, args.keep_days)
+    if args.vacuum:
+        conn.execute("VACUUM")
+    conn.close()
+    if horizon:
+        print(f"Samples before {datetime.fromtimestamp(horizon)} are archived in {ARCHIVE_DIR}/.")
+        print("The car_parking / bike_parking views only cover the later samples: "
+              "read both with archive.legacy_rows().")
+    else:
+        print("Nothing to archive.")
@@ -0,0 +1,182 @@
+import time
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import analyse
+import db
+import scraper
+import stats
+import synthetic
+import view_data
+
+# Benchmarks of the data path, run with: python benchmark.py
+#
+# Each scale "NxM" is a synthetic database of N car park / bike station pairs over M months
+# (synthetic.py, generated once into --data-dir and reused). Every measurement is printed and
+# appended as one JSON object per line to --output (default: benchmark_results.jsonl in
+# --data-dir, which git ignores), so runs can be compared over time.
+
+def legacy_process_data(raw_data):
+    # view_data.process_data before the vectorized version, kept as the reference
+    timestamps = []
+    values = []
+    for ts_str, val in raw_data:
+        try:
+            ts = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S.%f")
+        except ValueError:
+            try:
+                ts = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                continue
+        timestamps.append(ts)
+        values.append(val)
+    return timestamps, values
+
+def best_of(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def minute_rows(count, start=1768233278):
+    """count one-minute samples as (epoch, value) and as legacy (string, value) rows."""
+    epoch_rows = [(start + 60 * i, i % 500) for i in range(count)]
+    origin = datetime.fromtimestamp(start)
+    string_rows = [(str(origin + timedelta(minutes=i, microseconds=828078 if i % 2 else 0)), i % 500)
+                   for i in range(count)]
+    return epoch_rows, string_rows
+
+def bench_process_data(count):
+    epoch_rows, string_rows = minute_rows(count)
+    legacy = best_of(legacy_process_data, string_rows)
+    strings = best_of(view_data.process_data, string_rows)
+    epochs = best_of(view_data.process_data, epoch_rows)
+    print(f"process_data, {count} rows:")
+    print(f"  legacy strptime    {legacy * 1000:8.1f} ms")
+    print(f"  datetime64 strings {strings * 1000:8.1f} ms  (x{legacy / strings:.0f})")
+    print(f"  epoch integers     {epochs * 1000:8.1f} ms  (x{legacy / epochs:.0f})")
+    return [
+        {'benchmark': 'process_data.legacy', 'rows': count, 'seconds': legacy},
+        {'benchmark': 'process_data.strings', 'rows': count, 'seconds': strings},
+        {'benchmark': 'process_data.epochs', 'rows': count, 'seconds': epochs},
+    ]
+
+# --- Synthetic databases ---
+
+def parse_scale(text):
+    stations, months = text.lower().split('x')
+    return int(stations), int(months)
+
+def scratch_db(data_dir, stations, months, seed):
+    """Path of the synthetic database for this scale, generated on first use."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"synthetic_{stations}x{months}_seed{seed}.db")
+    if not os.path.exists(path):
+        print(f"Generating {path}...")
+        start = time.perf_counter()
+        synthetic.generate(path + ".tmp", stations, months, seed)
+        os.replace(path + ".tmp", path)
+        print(f"  done in {time.perf_counter() - start:.1f} s")
+    return path
+
+def bench_ingest(path, stations, ticks=20):
+    """Seconds per scraper tick (parse, insert, rollups, pair moments, commit) on a copy of the database."""
+    copy = path + ".ingest"
+    shutil.copyfile(path, copy)
+    conn = db.connect(copy)
+    last = conn.execute("SELECT MAX(ts) FROM car_sample").fetchone()[0]
+    payloads = [synthetic.payloads(stations, last + 60 * (i + 1)) for i in range(ticks)]
+    start = time.perf_counter()
+    for i, (cars, bikes) in enumerate(payloads):
+        scraper.save_rows(conn, scraper.build_car_rows(cars), scraper.build_bike_rows(bikes), last + 60 * (i + 1))
+        conn.commit()
+    seconds = (time.perf_counter() - start) / ticks
+    conn.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(copy + suffix):
+            os.remove(copy + suffix)
+    return seconds
+
+def bench_scale(path, stations, repeat):
+    db.DB_NAME = path
+    db.close_readers()
+    db.clear_cache()
+    # The undecorated readers, so every call really reads the database
+    shared = best_of(analyse.get_shared_parkings.__wrapped__, repeat=repeat)
+    parkings = analyse.get_shared_parkings()
+    first = parkings[0]
+    paired = best_of(analyse.get_paired_data.__wrapped__, first['car_name'], first['bike_name'], repeat=repeat)
+    all_paired = best_of(analyse.get_all_paired_data, parkings, repeat=repeat)
+    series = view_data.get_parking_data.__wrapped__(first['car_name'], 'Car')
+    fetch = best_of(view_data.get_parking_data.__wrapped__, first['car_name'], 'Car', repeat=repeat)
+    decode = best_of(view_data.process_data, series, repeat=repeat)
+
+    car_avail, _, bike_avail, _ = analyse.get_paired_data(first['car_name'], first['bike_name'])
+    correlation = best_of(stats.correlation, car_avail, bike_avail, repeat=repeat)
+    all_data = analyse.get_all_paired_data(parkings)
+    length = min(len(data[0]) for data in all_data)
+    matrix = np.vstack([data[0][:length] for data in all_data] + [data[2][:length] for data in all_data])
+    correlation_matrix = best_of(stats.correlation_matrix, matrix, repeat=repeat)
+    cached = best_of(analyse.get_paired_data, first['car_name'], first['bike_name'], repeat=repeat)
+    db.close_readers()
+    ingest = bench_ingest(path, stations)
+
+    return [
+        {'benchmark': 'get_shared_parkings', 'seconds': shared},
+        {'benchmark': 'get_paired_data', 'rows': len(car_avail), 'seconds': paired},
+        {'benchmark': 'get_paired_data.cached', 'rows': len(car_avail), 'seconds': cached},
+        {'benchmark': 'get_all_paired_data', 'rows': sum(len(data[0]) for data in all_data), 'seconds': all_paired},
+        {'benchmark': 'get_parking_data', 'rows': len(series), 'seconds': fetch},
+        {'benchmark': 'process_data', 'rows': len(series), 'seconds': decode},
+        {'benchmark': 'correlation', 'rows': len(car_avail), 'seconds': correlation},
+        {'benchmark': 'correlation_matrix', 'rows': length, 'series': len(matrix), 'seconds': correlation_matrix},
+        {'benchmark': 'ingest_tick', 'rows': 2 * stations, 'seconds': ingest},
+    ]
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'time': datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+            'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the parking data path.")
+    parser.add_argument('--rows', type=int, default=43200, help="samples per series (default: one month of minutes)")
+    parser.add_argument('--scales', default="5x1,20x3",
+                        help="comma-separated STATIONSxMONTHS synthetic databases (default: 5x1,20x3, '' to skip)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="runs per measurement, the best is kept (default: 3)")
+    parser.add_argument('--data-dir', default="bench_data", help="where synthetic databases are kept (default: bench_data)")
+    parser.add_argument('--output', default=None,
+                        help="JSON lines file the results are appended to (default: DATA_DIR/benchmark_results.jsonl)")
+    args = parser.parse_args()
+    if args.output is None:
+        os.makedirs(args.data_dir, exist_ok=True)
+        args.output = os.path.join(args.data_dir, "benchmark_results.jsonl")
+
+    run = environment()
+    results = bench_process_data(args.rows)
+    for scale in filter(None, args.scales.split(',')):
+        stations, months = parse_scale(scale)
+        path = scratch_db(args.data_dir, stations, months, args.seed)
+        print(f"\n{stations} stations x {months} months ({path}):")
+        for result in bench_scale(path, stations, args.repeat):
+            print(f"  {result['benchmark']:<24} {result['seconds'] * 1000:10.2f} ms  ({result.get('rows', '-')} rows)")
+            results.append(dict(result, stations=stations, months=months, seed=args.seed))
+
+    with open(args.output, 'a') as f:
+        for result in results:
+            f.write(json.dumps(dict(run, **result)) + "\n")
+    print(f"\n{len(results)} results appended to {args.output}")
@@ -1,48 +1,60 @@
 import sqlite3
+from datetime import datetime
 
-DB_NAME = "parking_data.db"
+import archive
+import db
+import rollup
+import schema
+
+def format_ts(ts):
+    return datetime.fromtimestamp(ts) if ts is not None else None
+
+def with_archive(kind, first, last):
+    # Les jours archivés précèdent ceux encore dans la base
+    cold_first, cold_last = archive.extent(kind)
+    if cold_first is None:
+        return first, last
+    return cold_first, last if last is not None else cold_last
 
 def get_date_range():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    conn = db.reader()
     
-    print(f"Analyse des dates dans {DB_NAME}...")
+    print(f"Analyse des dates dans {db.DB_NAME}...")
     
     # Check Car Parking
     try:
-        cursor.execute("SELECT MIN(timestamp), MAX(timestamp), COUNT(*) FROM car_parking")
-        result = cursor.fetchone()
-        if result:
-            car_min, car_max, car_count = result
-            print("\n--- Parking Voitures ---")
-            if car_count > 0:
-                print(f"Nombre d'entrées : {car_count}")
-                print(f"Début : {car_min}")
-                print(f"Fin   : {car_max}")
-            else:
-                print("Aucune donnée.")
+        # MIN/MAX via le journal des relevés, nombre d'entrées via les agrégats journaliers
+        first, last = with_archive('car', *db.query("SELECT MIN(ts), MAX(ts) FROM tick WHERE kind = 'car'")[0])
+        car_min, car_max = format_ts(first), format_ts(last)
+        car_count = rollup.sample_count(conn, 'car')
+        print("\n--- Parking Voitures ---")
+        if car_count > 0:
+            print(f"Nombre d'entrées : {car_count}")
+            print(f"Début : {car_min}")
+            print(f"Fin   : {car_max}")
+        else:
+            print("Aucune donnée.")
         
     except sqlite3.OperationalError as e:
         print(f"Erreur table voiture : {e}")
 
     # Check Bike Parking
     try:
-        cursor.execute("SELECT MIN(timestamp), MAX(timestamp), COUNT(*) FROM bike_parking")
-        result = cursor.fetchone()
-        if result:
-            bike_min, bike_max, bike_count = result
-            print("\n--- Parking Vélos ---")
-            if bike_count > 0:
-                print(f"Nombre d'entrées : {bike_count}")
-                print(f"Début : {bike_min}")
-                print(f"Fin   : {bike_max}")
-            else:
-                print("Aucune donnée.")
+        # MIN/MAX via le journal des relevés, nombre d'entrées via les agrégats journaliers
+        first, last = with_archive('bike', *db.query("SELECT MIN(ts), MAX(ts) FROM tick WHERE kind = 'bike'")[0])
+        bike_min, bike_max = format_ts(first), format_ts(last)
+        bike_count = rollup.sample_count(conn, 'bike')
+        print("\n--- Parking Vélos ---")
+        if bike_count > 0:
+            print(f"Nombre d'entrées : {bike_count}")
+            print(f"Début : {bike_min}")
+            print(f"Fin   : {bike_max}")
+        else:
+            print("Aucune donnée.")
             
     except sqlite3.OperationalError as e:
         print(f"Erreur table vélo : {e}")
-        
-    conn.close()
 
 if __name__ == "__main__":
+    schema.upgrade_db(db.DB_NAME)
     get_date_range()
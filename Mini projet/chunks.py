@@ -0,0 +1,81 @@
+import csv
+import itertools
+
+import numpy as np
+
+# Streaming reads: query results are consumed CHUNK_SIZE rows at a time and turned column by
+# column into typed NumPy arrays, instead of fetchall() into a list of tuples that is then
+# copied again into per-column lists. A consumer either works chunk by chunk (bounded memory:
+# stats.chunked_summary, downsample.minmax_chunks, write_csv) or collects the chunks into
+# compact buffers, which costs the size of the arrays and not several times that.
+
+CHUNK_SIZE = 50000
+
+def fetch_chunks(rows, size=CHUNK_SIZE):
+    """Lists of at most size rows: cursor.fetchmany() for a cursor, any other iterable sliced."""
+    if hasattr(rows, 'fetchmany'):
+        while True:
+            chunk = rows.fetchmany(size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
+
+def _column(chunk, i, dtype):
+    if np.dtype(dtype).kind == 'f':
+        # NULL becomes NaN
+        values = (np.nan if row[i] is None else row[i] for row in chunk)
+    else:
+        values = (row[i] for row in chunk)
+    return np.fromiter(values, dtype=dtype, count=len(chunk))
+
+def column_chunks(rows, dtypes, size=CHUNK_SIZE):
+    """One tuple of arrays per chunk of rows, column i typed dtypes[i] (float columns: None -> NaN)."""
+    for chunk in fetch_chunks(rows, size):
+        yield tuple(_column(chunk, i, dtype) for i, dtype in enumerate(dtypes))
+
+class Buffer:
+    """Growable typed array: appends chunks in amortized O(1), without Python objects per value."""
+
+    def __init__(self, dtype, capacity=CHUNK_SIZE):
+        self.data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        end = self.size + len(values)
+        if end > len(self.data):
+            grown = np.empty(max(end, 2 * len(self.data)), dtype=self.data.dtype)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+        self.data[self.size:end] = values
+        self.size = end
+
+    def array(self):
+        """The values appended so far, trimmed to a right-sized copy."""
+        return self.data[:self.size].copy()
+
+def collect(chunks, dtypes):
+    """Concatenates column chunks into one array per column."""
+    buffers = [Buffer(dtype) for dtype in dtypes]
+    for columns in chunks:
+        for buffer, column in zip(buffers, columns):
+            buffer.extend(column)
+    return tuple(buffer.array() for buffer in buffers)
+
+def write_csv(path, header, chunks):
+    """Writes column chunks to a CSV file as they come (NaN as an empty field); returns the row count."""
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for columns in chunks:
+            rows = zip(*[column.tolist() for column in columns])
+            writer.writerows(tuple('' if v != v else v for v in row) for row in rows)
+            count += len(columns[0])
+    return count
@@ -0,0 +1,110 @@
+import collections
+import functools
+import os
+import pathlib
+import sqlite3
+import threading
+
+# Data access shared by every script: the database path, connection setup, one long-lived
+# read-only connection per process and thread, and an LRU cache of query results.
+#
+# A cached result stays valid until the scraper logs a newer tick, i.e. until MAX(ts) of the
+# car or bike ticks advances; both are read from the tick primary key, so checking is cheap.
+
+DB_NAME = "parking_data.db"
+CACHE_SIZE = 128          # cached results
+STATEMENT_CACHE = 256     # prepared statements kept by each connection
+
+def configure_connection(conn):
+    """Pragmas for the long-lived scraper connection.
+
+    WAL lets analyse.py / view_data.py read while the scraper writes, and synchronous=NORMAL
+    only syncs at checkpoints, which is safe in WAL mode.
+    """
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA cache_size = -16000")  # 16 MB
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA busy_timeout = 5000")
+
+def connect(db_name=None):
+    """Read-write connection with the pragmas above."""
+    conn = sqlite3.connect(db_name or DB_NAME, cached_statements=STATEMENT_CACHE)
+    configure_connection(conn)
+    return conn
+
+def connect_readonly(db_name=None):
+    uri = pathlib.Path(db_name or DB_NAME).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, cached_statements=STATEMENT_CACHE)
+    conn.execute("PRAGMA cache_size = -16000")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+_local = threading.local()
+
+def reader(db_name=None):
+    """Long-lived read-only connection of the current thread, opened on first use.
+
+    A process forked with open connections (ProcessPoolExecutor workers) opens its own.
+    """
+    path = str(pathlib.Path(db_name or DB_NAME).resolve())
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.conns = {}
+    if path not in _local.conns:
+        _local.conns[path] = connect_readonly(path)
+    return _local.conns[path]
+
+def close_readers():
+    for conn in getattr(_local, 'conns', {}).values():
+        conn.close()
+    _local.conns = {}
+
+# --- Result cache ---
+
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+def data_version(conn):
+    """Latest tick timestamps; any new snapshot changes them, even with change-only storage."""
+    return conn.execute("""
+        SELECT (SELECT MAX(ts) FROM tick WHERE kind = 'car'), (SELECT MAX(ts) FROM tick WHERE kind = 'bike')
+    """).fetchone()
+
+def _cached_call(key, db_name, compute):
+    conn = reader(db_name)
+    version = data_version(conn)
+    key = (str(pathlib.Path(db_name or DB_NAME).resolve()),) + key
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and hit[0] == version:
+            _cache.move_to_end(key)
+            return hit[1]
+    result = compute(conn)
+    with _cache_lock:
+        _cache[key] = (version, result)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+def query(sql, params=(), db_name=None):
+    """fetchall() of a read query, answered from the cache while no newer sample was stored."""
+    return _cached_call(('query', sql, tuple(params)), db_name,
+                        lambda conn: conn.execute(sql, params).fetchall())
+
+def cached(func):
+    """Caches a reader's results like query(), keyed on its (hashable) arguments.
+
+    The result is shared between calls: callers must not modify it.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+        return _cached_call(key, None, lambda conn: func(*args, **kwargs))
+    return wrapper
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
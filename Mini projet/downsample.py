@@ -0,0 +1,106 @@
+import numpy as np
+
+# Plot-oriented downsampling: reduce a long series to about as many points as the figure
+# has pixels while keeping its visual shape (peaks and troughs).
+# x may be numeric or datetime64 and must be sorted; NaN values in y are dropped.
+
+def _as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[s]').astype(np.int64).astype(float)
+    return x.astype(float)
+
+def _finite(x, y):
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    keep = np.isfinite(y)
+    return x[keep], y[keep]
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: keeps n_out points, first and last included."""
+    x, y = _finite(x, y)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    xf = _as_float(x)
+    # n_out - 2 buckets between the first and the last point
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = xf[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = xf[n - 1], y[n - 1]
+        # Point of the bucket forming the largest triangle with the previous pick and the next bucket's mean
+        area = np.abs((xf[a] - avg_x) * (y[start:end] - y[a]) - (xf[a] - xf[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+def minmax(x, y, n_buckets):
+    """Keeps the minimum and the maximum of each of n_buckets equal time slices (at most 2 * n_buckets points)."""
+    x, y = _finite(x, y)
+    n = len(y)
+    if n <= 2 * n_buckets or n_buckets < 1:
+        return x, y
+
+    xf = _as_float(x)
+    span = xf[-1] - xf[0]
+    if span <= 0:
+        bucket = np.arange(n) * n_buckets // n
+    else:
+        bucket = np.minimum(((xf - xf[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+    _, starts = np.unique(bucket, return_index=True)
+    sizes = np.diff(np.append(starts, n))
+
+    picks = []
+    for reduce in (np.minimum, np.maximum):
+        extreme = np.repeat(reduce.reduceat(y, starts), sizes)
+        hits = np.flatnonzero(y == extreme)
+        # first index reaching the extreme in each bucket
+        _, first = np.unique(bucket[hits], return_index=True)
+        picks.append(hits[first])
+    selected = np.unique(np.concatenate(picks))
+    return x[selected], y[selected]
+
+def minmax_chunks(chunks, first, last, n_buckets):
+    """minmax() over (x, y) chunks in time order, holding only the running extremes of each slice.
+
+    x is numeric (e.g. epoch seconds) and the slices split [first, last]; as in minmax(), the
+    first point reaching each extreme is kept. Returns (x, y) arrays ordered by x.
+    """
+    span = max(last - first, 1)
+    extremes = {np.minimum: np.full(n_buckets, np.inf), np.maximum: np.full(n_buckets, -np.inf)}
+    positions = {np.minimum: np.zeros(n_buckets), np.maximum: np.zeros(n_buckets)}
+    for x, y in chunks:
+        x, y = _finite(x, y)
+        if not len(y):
+            continue
+        xf = _as_float(x)
+        bucket = np.clip(((xf - first) / span * n_buckets).astype(np.int64), 0, n_buckets - 1)
+        for reduce, best in extremes.items():
+            # Extreme of each slice within the chunk, and the first point reaching it
+            value = np.full(n_buckets, np.inf if reduce is np.minimum else -np.inf)
+            reduce.at(value, bucket, y)
+            hits = np.flatnonzero(y == value[bucket])
+            slices, first_hit = np.unique(bucket[hits], return_index=True)
+            hit = hits[first_hit]
+            # Chunks come in time order: an equal extreme from a later chunk does not replace the earlier one
+            replace = (y[hit] < best[slices]) if reduce is np.minimum else (y[hit] > best[slices])
+            best[slices[replace]] = y[hit][replace]
+            positions[reduce][slices[replace]] = xf[hit][replace]
+
+    picks = set()
+    for reduce, best in extremes.items():
+        found = np.isfinite(best)
+        picks.update(zip(positions[reduce][found].tolist(), best[found].tolist()))
+    picks = sorted(picks)
+    return np.array([p[0] for p in picks]), np.array([p[1] for p in picks], dtype=float)
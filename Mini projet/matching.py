@@ -0,0 +1,107 @@
+import sqlite3
+import unicodedata
+
+# Car park <-> bike station matching shared by analyse.py and view_data.py.
+# Names are normalized once, candidates come from a trigram index, and the resulting
+# mapping is stored in station_match until new stations appear in the station table.
+
+def normalize_string(s):
+    return ''.join(c for c in unicodedata.normalize('NFD', s)
+                  if unicodedata.category(c) != 'Mn').lower()
+
+def is_match(name1, name2):
+    return _is_normalized_match(normalize_string(name1), normalize_string(name2))
+
+def _is_normalized_match(n1, n2):
+    if n1 == n2:
+        return True
+    # Check for containment but ensure it's significant
+    if len(n1) > 3 and n1 in n2:
+        return True
+    if len(n2) > 3 and n2 in n1:
+        return True
+    return False
+
+def _trigrams(s):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+def match_stations(car_names, bike_names):
+    """Pairs each car park with the first unused matching bike station, in the given orders.
+
+    Same result as testing is_match on every (car, bike) pair, without the N x M loop:
+    if a contains b (len(b) > 3), every trigram of b is a trigram of a, so the only
+    candidates are the bikes sharing all of the car's trigrams or all of their own.
+    """
+    bike_norm = [normalize_string(b) for b in bike_names]
+    bike_trigrams = [_trigrams(n) for n in bike_norm]
+
+    by_name = {}
+    index = {}
+    for i, (n, grams) in enumerate(zip(bike_norm, bike_trigrams)):
+        by_name.setdefault(n, []).append(i)
+        for g in grams:
+            index.setdefault(g, []).append(i)
+
+    pairs = []
+    used = set()
+    for car_name in car_names:
+        n = normalize_string(car_name)
+        grams = _trigrams(n)
+
+        hits = {}
+        for g in grams:
+            for i in index.get(g, ()):
+                hits[i] = hits.get(i, 0) + 1
+
+        candidates = set(by_name.get(n, ()))
+        for i, count in hits.items():
+            if count == len(grams) or count == len(bike_trigrams[i]):
+                candidates.add(i)
+
+        for i in sorted(candidates):
+            if i not in used and _is_normalized_match(n, bike_norm[i]):
+                pairs.append((car_name, bike_names[i]))
+                used.add(i)
+                break
+    return pairs
+
+def _station_names(cursor, kind):
+    cursor.execute("SELECT DISTINCT name FROM station WHERE kind = ? ORDER BY name", (kind,))
+    return [row[0] for row in cursor.fetchall()]
+
+def catalog_version(conn):
+    """Changes exactly when new stations appear: they are only ever added, so (count, max key) is enough."""
+    count, max_key = conn.execute("SELECT COUNT(*), COALESCE(MAX(station_key), 0) FROM station").fetchone()
+    return f"{count}:{max_key}"
+
+def get_catalog(conn, commit=True):
+    """Returns (car_names, bike_names, pairs), recomputing the stored matching only if stations changed.
+
+    With commit=False a refreshed matching is written inside the caller's open transaction.
+    """
+    cursor = conn.cursor()
+    car_names = _station_names(cursor, 'car')
+    bike_names = _station_names(cursor, 'bike')
+
+    version = catalog_version(conn)
+    cursor.execute("SELECT value FROM meta WHERE key = 'station_match_version'")
+    row = cursor.fetchone()
+    if row is not None and row[0] == version:
+        cursor.execute("SELECT car_name, bike_name FROM station_match ORDER BY car_name")
+        return car_names, bike_names, cursor.fetchall()
+
+    pairs = match_stations(car_names, bike_names)
+    try:
+        conn.execute("DELETE FROM station_match")
+        conn.executemany("INSERT INTO station_match (car_name, bike_name) VALUES (?, ?)", pairs)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('station_match_version', ?)", (version,))
+        if commit:
+            conn.commit()
+    except sqlite3.OperationalError:
+        # Read-only connection (db.reader): use the fresh result without storing it, and do not
+        # leave the implicit transaction of the failed write open on the long-lived connection
+        conn.rollback()
+    return car_names, bike_names, pairs
+
+def get_matches(conn):
+    return get_catalog(conn)[2]
@@ -0,0 +1,149 @@
+import argparse
+import collections
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Timing spans and counters of the scraper hot path.
+#
+# The scraper wraps each stage of a tick (HTTP, JSON decoding, row building, INSERT, commit)
+# in a span. The values of a tick are stored in the metric table, one row per (tick, name),
+# and the recent ones are kept in memory for percentiles and the Prometheus text export.
+# Stored values older than RETENTION_DAYS are pruned as new ticks are saved, so the table
+# stays a few days of history instead of growing with every tick.
+
+WINDOW = 1000              # recent observations kept per span for the percentiles
+QUANTILES = (0.5, 0.9, 0.99)
+ALARM_RATIO = 0.8          # warn when a tick uses more than this share of the interval
+RETENTION_DAYS = 14        # stored metric history
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE metric (
+            ts INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (ts, name)
+        ) WITHOUT ROWID
+    ''')
+
+class Metrics:
+    def __init__(self, counters=(), window=WINDOW, retention_days=RETENTION_DAYS):
+        """counters: names exported from the start, at 0, before their first increment.
+
+        retention_days: stored values older than this are deleted by save() (None keeps them all).
+        """
+        self._lock = threading.Lock()
+        self.retention = retention_days * 86400 if retention_days else None
+        self.recent = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self.sums = collections.Counter()      # span name -> total seconds
+        self.counts = collections.Counter()    # span name -> observations
+        self.counters = collections.Counter({name: 0 for name in counters})  # name -> running total
+        self.tick = {}                         # values of the current tick, flushed by save()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self.recent[name].append(seconds)
+            self.sums[name] += seconds
+            self.counts[name] += 1
+            self.tick[name] = self.tick.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+            self.tick[name] = self.tick.get(name, 0) + n
+
+    def last(self, name):
+        values = self.recent.get(name)
+        return values[-1] if values else None
+
+    def quantiles(self, name, qs=QUANTILES):
+        with self._lock:
+            values = list(self.recent.get(name, ()))
+        if not values:
+            return {}
+        return dict(zip(qs, np.quantile(values, qs).tolist()))
+
+    def save(self, conn, ts):
+        """Stores the values of the tick under ts (in the caller's transaction) and starts a new tick.
+
+        Rows older than the retention window are dropped at the same time: a range delete on
+        the leading ts of the primary key, so it only touches the expired rows.
+        """
+        with self._lock:
+            rows = [(ts, name, value) for name, value in self.tick.items()]
+            self.tick = {}
+        conn.executemany("INSERT OR REPLACE INTO metric (ts, name, value) VALUES (?, ?, ?)", rows)
+        if self.retention is not None:
+            conn.execute("DELETE FROM metric WHERE ts < ?", (ts - self.retention,))
+
+    def prometheus(self, prefix="scraper"):
+        """Prometheus text exposition: one summary per span, one counter per counter."""
+        lines = []
+        if self.counts:
+            lines.append(f"# TYPE {prefix}_stage_seconds summary")
+        for name in sorted(self.counts):
+            for q, value in self.quantiles(name).items():
+                lines.append(f'{prefix}_stage_seconds{{stage="{name}",quantile="{q}"}} {value:.6f}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {self.sums[name]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {self.counts[name]}')
+        for name in sorted(self.counters):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {self.counters[name]}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, prefix="scraper"):
+        # Written aside then renamed, so the node exporter never reads half a file
+        tmp = path + ".tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.prometheus(prefix))
+        os.replace(tmp, path)
+
+def check_overrun(metrics, seconds, interval, ratio=ALARM_RATIO):
+    """Counts and reports a tick that used more than ratio of the sampling interval."""
+    if seconds <= ratio * interval:
+        return False
+    metrics.count('tick_overruns')
+    print(f"ALARM: tick took {seconds:.2f}s, {seconds / interval:.0%} of the {interval:g}s interval.")
+    return True
+
+def summary(conn, since=None):
+    """(name, count, p50, p90, p99, max) of every stored metric since the given epoch."""
+    query = "SELECT name, value FROM metric"
+    params = ()
+    if since is not None:
+        query += " WHERE ts >= ?"
+        params = (since,)
+    values = collections.defaultdict(list)
+    for name, value in conn.execute(query + " ORDER BY name, ts", params):
+        values[name].append(value)
+    rows = []
+    for name, series in values.items():
+        p50, p90, p99 = np.quantile(series, QUANTILES)
+        rows.append((name, len(series), p50, p90, p99, max(series)))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Percentiles of the scraper metrics stored in the database.")
+    parser.add_argument('--hours', type=float, default=24, help="look back this many hours (default: 24, 0 = all)")
+    args = parser.parse_args()
+
+    import db
+    conn = sqlite3.connect(db.DB_NAME)
+    since = int(time.time() - args.hours * 3600) if args.hours else None
+    print(f"{'metric':<16} {'ticks':>7} {'p50':>10} {'p90':>10} {'p99':>10} {'max':>10}")
+    for name, count, p50, p90, p99, high in summary(conn, since):
+        print(f"{name:<16} {count:>7} {p50:>10.4f} {p90:>10.4f} {p99:>10.4f} {high:>10.4f}")
+    conn.close()
@@ -0,0 +1,197 @@
+import sqlite3
+import sys
+
+import numpy as np
+
+import matching
+import runlength
+import timejoin
+
+# Streaming Pearson state per matched (car park, bike station) pair.
+#
+# A state is (n, mean_x, mean_y, m2_x, m2_y, c_xy): the sample count, the two means, the two sums
+# of squared deviations and the co-moment (Welford). Two states over disjoint periods merge
+# exactly (Chan et al.), so the scraper keeps one state per pair and per hour, plus an
+# all-time state, and any window is the merge of its hours.
+
+HOUR = 3600
+ALL_TIME = -1  # bucket of the all-time state
+EMPTY = (0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE pair_moments (
+            car_key INTEGER NOT NULL,
+            bike_key INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            mean_x REAL NOT NULL,
+            mean_y REAL NOT NULL,
+            m2_x REAL NOT NULL,
+            m2_y REAL NOT NULL,
+            c_xy REAL NOT NULL,
+            PRIMARY KEY (car_key, bike_key, bucket)
+        ) WITHOUT ROWID
+    ''')
+
+def merge(a, b):
+    n_a, mx_a, my_a, m2x_a, m2y_a, c_a = a
+    n_b, mx_b, my_b, m2x_b, m2y_b, c_b = b
+    if n_a == 0:
+        return tuple(b)
+    if n_b == 0:
+        return tuple(a)
+    n = n_a + n_b
+    dx = mx_b - mx_a
+    dy = my_b - my_a
+    weight = n_a * n_b / n
+    return (
+        n,
+        mx_a + dx * n_b / n,
+        my_a + dy * n_b / n,
+        m2x_a + m2x_b + dx * dx * weight,
+        m2y_a + m2y_b + dy * dy * weight,
+        c_a + c_b + dx * dy * weight,
+    )
+
+def update(state, x, y):
+    return merge(state, (1, float(x), float(y), 0.0, 0.0, 0.0))
+
+def merge_all(states):
+    result = EMPTY
+    for state in states:
+        result = merge(result, state)
+    return result
+
+def correlation(state):
+    n, _, _, m2_x, m2_y, c_xy = state
+    denominator = np.sqrt(m2_x * m2_y)
+    if n < 2 or denominator == 0:
+        return 0.0
+    return float(c_xy / denominator)
+
+def hourly_states(ts, x, y):
+    """States of each hour of a series, computed in a few vectorized passes: (bucket, state) list."""
+    ts = np.asarray(ts, dtype=np.int64)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if ts.size == 0:
+        return []
+    hours = ts - ts % HOUR
+    buckets, starts = np.unique(hours, return_index=True)
+    counts = np.diff(np.append(starts, ts.size))
+    mean_x = np.add.reduceat(x, starts) / counts
+    mean_y = np.add.reduceat(y, starts) / counts
+    dx = x - np.repeat(mean_x, counts)
+    dy = y - np.repeat(mean_y, counts)
+    m2_x = np.add.reduceat(dx * dx, starts)
+    m2_y = np.add.reduceat(dy * dy, starts)
+    c_xy = np.add.reduceat(dx * dy, starts)
+    return [(int(b), (int(n), float(a), float(c), float(d), float(e), float(f)))
+            for b, n, a, c, d, e, f in zip(buckets, counts, mean_x, mean_y, m2_x, m2_y, c_xy)]
+
+def pair_keys(conn, commit=True):
+    """(car_key, bike_key, car_name, bike_name) of every matched pair."""
+    pairs = matching.get_catalog(conn, commit)[2]
+    rows = []
+    for car_name, bike_name in pairs:
+        cars = conn.execute("SELECT station_key FROM station WHERE kind = 'car' AND name = ?", (car_name,)).fetchall()
+        bikes = conn.execute("SELECT station_key FROM station WHERE kind = 'bike' AND name = ?", (bike_name,)).fetchall()
+        rows.extend((c[0], b[0], car_name, bike_name) for c in cars for b in bikes)
+    return rows
+
+def _load(cursor, car_key, bike_key, buckets):
+    placeholders = ", ".join("?" * len(buckets))
+    cursor.execute(f'''
+        SELECT bucket, n, mean_x, mean_y, m2_x, m2_y, c_xy FROM pair_moments
+        WHERE car_key = ? AND bike_key = ? AND bucket IN ({placeholders})
+    ''', (car_key, bike_key) + tuple(buckets))
+    return {row[0]: row[1:] for row in cursor.fetchall()}
+
+def _store(cursor, rows):
+    cursor.executemany('''
+        INSERT OR REPLACE INTO pair_moments (car_key, bike_key, bucket, n, mean_x, mean_y, m2_x, m2_y, c_xy)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+def record(cursor, pairs, car_values, bike_values, ts):
+    """Adds the snapshot taken at ts to the hourly and all-time state of each pair.
+
+    pairs: (car_key, bike_key) list; car_values / bike_values: station_key -> availability.
+    """
+    hour = ts - ts % HOUR
+    rows = []
+    for car_key, bike_key in pairs:
+        x = car_values.get(car_key)
+        y = bike_values.get(bike_key)
+        if x is None or y is None:
+            continue
+        states = _load(cursor, car_key, bike_key, (hour, ALL_TIME))
+        for bucket in (hour, ALL_TIME):
+            rows.append((car_key, bike_key, bucket) + update(states.get(bucket, EMPTY), x, y))
+    _store(cursor, rows)
+
+def rebuild(conn, commit=True, since=0):
+    """Recomputes the pair states from the sample tables (exact-timestamp pairs).
+
+    Hourly states before since (the archive horizon) are kept; the all-time state merges them all.
+    """
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM pair_moments WHERE bucket >= ? OR bucket = ?", (since, ALL_TIME))
+    car_table = runlength.sample_table(conn, 'car')
+    bike_table = runlength.sample_table(conn, 'bike')
+    for car_key, bike_key, _, _ in pair_keys(conn, commit):
+        car_rows = conn.execute(f'''
+            SELECT 0, ts, available FROM {car_table}
+            WHERE station_key = ? AND ts >= ? AND available IS NOT NULL ORDER BY ts
+        ''', (car_key, since))
+        bike_rows = conn.execute(f'''
+            SELECT 0, ts, available FROM {bike_table}
+            WHERE station_key = ? AND ts >= ? AND available IS NOT NULL ORDER BY ts
+        ''', (bike_key, since))
+        joined = np.array([r[1:] for r in timejoin.asof_join(car_rows, bike_rows, 0)], dtype=float).reshape(-1, 3)
+        hourly = hourly_states(joined[:, 0], joined[:, 1], joined[:, 2])
+        _store(cursor, [(car_key, bike_key, bucket) + state for bucket, state in hourly])
+
+        cursor.execute('''
+            SELECT n, mean_x, mean_y, m2_x, m2_y, c_xy FROM pair_moments
+            WHERE car_key = ? AND bike_key = ? AND bucket >= 0 ORDER BY bucket
+        ''', (car_key, bike_key))
+        states = cursor.fetchall()
+        if states:
+            _store(cursor, [(car_key, bike_key, ALL_TIME) + merge_all(states)])
+
+def window_state(conn, car_name, bike_name, seconds=None):
+    """Merged state of a pair over its last `seconds` of data (all time if None)."""
+    query = '''
+        SELECT m.bucket, m.n, m.mean_x, m.mean_y, m.m2_x, m.m2_y, m.c_xy
+        FROM station sc
+        JOIN station sb ON sb.kind = 'bike' AND sb.name = ?
+        JOIN pair_moments m ON m.car_key = sc.station_key AND m.bike_key = sb.station_key
+        WHERE sc.kind = 'car' AND sc.name = ? AND m.bucket {}
+    '''
+    if seconds is None:
+        rows = conn.execute(query.format("= ?"), (bike_name, car_name, ALL_TIME)).fetchall()
+    else:
+        last = conn.execute(query.format(">= 0 ORDER BY m.bucket DESC LIMIT 1"), (bike_name, car_name)).fetchone()
+        if last is None:
+            return EMPTY
+        start = last[0] + HOUR - seconds
+        rows = conn.execute(query.format(">= ?"), (bike_name, car_name, start)).fetchall()
+    return merge_all(row[1:] for row in rows)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != '--rebuild':
+        print("Usage: python moments.py --rebuild [db]")
+        sys.exit(1)
+    import archive
+    import db
+    import schema
+    db_name = sys.argv[2] if len(sys.argv) > 2 else db.DB_NAME
+    conn = sqlite3.connect(db_name)
+    schema.migrate(conn)
+    rebuild(conn, commit=False, since=archive.get_horizon(conn))
+    conn.commit()
+    count = conn.execute("SELECT COUNT(*) FROM pair_moments").fetchone()[0]
+    conn.close()
+    print(f"Pair moments rebuilt in {db_name}: {count} rows.")
@@ -0,0 +1,33 @@
+import matplotlib.pyplot as plt
+import numpy as np
+
+import stats
+
+# Tracés partagés par DM1/main.py et analyse.py (--heatmap).
+
+def heatmap_correlations(listes, noms=None, matrice=None):
+    # matrice : corrélations déjà calculées (par exemple par tranches), listes n'est alors pas relu
+    n = len(listes) if matrice is None else len(matrice)
+    if matrice is None:
+        # Toute la matrice en un seul calcul au lieu de n² corrélations deux à deux
+        matrice = stats.correlation_matrix(listes)
+    matrice = np.array(matrice, dtype=float)
+    np.fill_diagonal(matrice, 1)
+    
+    if noms is None:
+        noms = [f"Liste {i+1}" for i in range(n)]
+    
+    plt.figure(figsize=(8, 6))
+    plt.imshow(matrice, cmap='coolwarm', vmin=-1, vmax=1)
+    plt.colorbar(label='Coefficient de corrélation')
+    plt.xticks(range(n), noms, rotation=45)
+    plt.yticks(range(n), noms)
+    plt.title('Heatmap des corrélations')
+    
+    # Les valeurs ne restent lisibles que sur une petite matrice
+    for i in range(n if n <= 20 else 0):
+        for j in range(n):
+            plt.text(j, i, f'{matrice[i][j]:.2f}', ha='center', va='center', color='black')
+    
+    plt.tight_layout()
+    plt.show()
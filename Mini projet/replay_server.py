@@ -0,0 +1,240 @@
+import argparse
+import bisect
+import email.utils
+import gzip
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import db
+import runlength
+import schema
+import synthetic
+
+# Local stand-in for the open-data portal, for offline and faster-than-real-time ingest tests.
+#
+# Serves /offstreetparking and /bikestation as NGSI payloads, either replayed from a database
+# (one snapshot per logged tick) or generated by synthetic.py. The replay clock runs --speed
+# times faster than the wall clock; --latency / --jitter delay every response, --error-rate
+# answers a share of the requests with --error-status, and --scale serves every station
+# that many times under distinct ids and names. Like a caching HTTP server, responses carry an
+# ETag and a Last-Modified date, a request with the current ETag gets a 304, and bodies are
+# gzipped for clients that accept it.
+#
+#     python replay_server.py --speed 60 --scale 10 &
+#     python scraper.py --base-url http://localhost:8765 --interval 1
+
+PORT = 8765
+INTERVAL = 60  # seconds between two synthetic snapshots
+
+class RecordedSource:
+    """Snapshots of a database: the tick at or before the replay time, with its stations."""
+
+    def __init__(self, db_name):
+        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.ticks = [row[0] for row in self.conn.execute("SELECT DISTINCT ts FROM tick ORDER BY ts")]
+        if not self.ticks:
+            raise SystemExit(f"No snapshot to replay in {db_name}.")
+        self.start, self.end = self.ticks[0], self.ticks[-1]
+
+    def tick_at(self, ts):
+        """Last recorded tick at or before ts."""
+        return self.ticks[max(bisect.bisect_right(self.ticks, ts) - 1, 0)]
+
+    def payloads(self, tick):
+        with self.lock:
+            return self._load(tick)
+
+    def _load(self, tick):
+        cars = [synthetic.car_item(*row) for row in self.conn.execute(f'''
+            SELECT s.ngsi_id, s.name, x.available, x.total, x.status
+            FROM {runlength.sample_table(self.conn, 'car')} x
+            JOIN station s ON s.station_key = x.station_key
+            WHERE x.ts = ? ORDER BY s.station_key
+        ''', (tick,))]
+        bikes = [synthetic.bike_item(*row) for row in self.conn.execute(f'''
+            SELECT s.ngsi_id, s.name, x.available, x.free, x.total, x.status
+            FROM {runlength.sample_table(self.conn, 'bike')} x
+            JOIN station s ON s.station_key = x.station_key
+            WHERE x.ts = ? ORDER BY s.station_key
+        ''', (tick,))]
+        return cars, bikes
+
+class SyntheticSource:
+    """synthetic.payloads() of the stations, on a tick every INTERVAL seconds."""
+
+    def __init__(self, stations, seed=0, start=None):
+        self.stations = stations
+        self.seed = seed
+        self.start = start if start is not None else synthetic.START
+        self.end = None
+
+    def tick_at(self, ts):
+        return ts - ts % INTERVAL
+
+    def payloads(self, tick):
+        return synthetic.payloads(self.stations, tick, self.seed)
+
+def scale_items(items, scale, name_key):
+    """Repeats every station scale times, with distinct ids and names."""
+    if scale <= 1:
+        return items
+    scaled = list(items)
+    for copy in range(2, scale + 1):
+        for item in items:
+            item = json.loads(json.dumps(item))
+            item['id'] = f"{item['id']}-{copy}"
+            if name_key == 'name':
+                item['name']['value'] = f"{item['name']['value']} #{copy}"
+            else:
+                item['address']['value']['streetAddress'] = f"{item['address']['value']['streetAddress']} #{copy}"
+            scaled.append(item)
+    return scaled
+
+class ReplayClock:
+    """Maps the wall clock to the replayed time: start + elapsed * speed, looping over [start, end] if asked."""
+
+    def __init__(self, start, end=None, speed=1.0, loop=False):
+        self.start, self.end, self.speed, self.loop = start, end, speed, loop
+        self.origin = time.time()
+
+    def now(self):
+        ts = self.start + (time.time() - self.origin) * self.speed
+        if self.end is not None and ts > self.end:
+            ts = self.start + (ts - self.start) % (self.end - self.start + 1) if self.loop else self.end
+        return int(ts)
+
+class Body:
+    """One encoded response: JSON bytes, their gzip, and the validators of the content."""
+
+    def __init__(self, data, tick, previous=None):
+        self.data = data
+        self.etag = '"' + hashlib.sha1(data).hexdigest()[:16] + '"'
+        # The content is dated from the tick it first appeared in
+        modified = previous.modified if previous is not None and previous.etag == self.etag else tick
+        self.modified = modified
+        self.last_modified = email.utils.formatdate(modified, usegmt=True)
+        self.gzipped = gzip.compress(data, compresslevel=5)
+
+class Bodies:
+    """Encoded responses of the current tick: built once, then served to every request of that tick."""
+
+    def __init__(self, source, scale):
+        self.source, self.scale = source, scale
+        self.lock = threading.Lock()
+        self.tick = None
+        self.bodies = {}
+
+    def get(self, ts, path):
+        tick = self.source.tick_at(ts)
+        with self.lock:
+            if tick != self.tick:
+                cars, bikes = self.source.payloads(tick)
+                self.bodies = {
+                    path: Body(json.dumps(scale_items(items, self.scale, name_key)).encode(), tick, self.bodies.get(path))
+                    for path, items, name_key in (('/offstreetparking', cars, 'name'), ('/bikestation', bikes, 'address'))
+                }
+                self.tick = tick
+            return self.bodies[path]
+
+def not_modified(headers, body):
+    etags = headers.get('If-None-Match')
+    if etags is not None:
+        return body.etag in [tag.strip() for tag in etags.split(',')] or etags.strip() == '*'
+    since = headers.get('If-Modified-Since')
+    if since is not None:
+        try:
+            return body.modified <= email.utils.parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def make_handler(source, clock, options):
+    bodies = Bodies(source, options.scale)
+
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real portal
+
+        def do_GET(self):
+            path = self.path.split('?')[0].rstrip('/')
+            if options.latency or options.jitter:
+                time.sleep(max(0.0, random.gauss(options.latency, options.jitter)) / 1000)
+
+            if path == '/status':
+                ts = clock.now()
+                return self.send_json(200, {'replay_time': ts, 'speed': clock.speed, 'source': options.source})
+            if path not in ('/offstreetparking', '/bikestation'):
+                return self.send_json(404, {'error': 'not found'})
+            if random.random() < options.error_rate:
+                return self.send_json(options.error_status, {'error': 'injected'})
+
+            body = bodies.get(clock.now(), path)
+            validators = {'ETag': body.etag, 'Last-Modified': body.last_modified}
+            if not_modified(self.headers, body):
+                return self.send_body(304, b'', validators)
+            if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                return self.send_body(200, body.gzipped, dict(validators, **{'Content-Encoding': 'gzip'}))
+            self.send_body(200, body.data, validators)
+
+        def send_json(self, status, payload):
+            self.send_body(status, json.dumps(payload).encode())
+
+        def send_body(self, status, body, headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            if status != 304:
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            if options.verbose:
+                super().log_message(format, *args)
+
+    return ReplayHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded or synthetic parking payloads locally.")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--source', choices=['recorded', 'synthetic'], default='recorded',
+                        help="replay the snapshots of --db (default) or generate synthetic ones")
+    parser.add_argument('--db', default=None, help=f"database to replay (default: {db.DB_NAME})")
+    parser.add_argument('--stations', type=int, default=20, help="synthetic station pairs (default: 20)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--start', type=int, default=None, help="replayed epoch at startup (default: first snapshot)")
+    parser.add_argument('--speed', type=float, default=1.0, help="replayed seconds per wall-clock second (default: 1)")
+    parser.add_argument('--loop', action='store_true', help="start over after the last recorded snapshot")
+    parser.add_argument('--latency', type=float, default=0.0, help="mean response delay in ms")
+    parser.add_argument('--jitter', type=float, default=0.0, help="standard deviation of the delay in ms")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument('--error-status', type=int, default=503, help="HTTP status of injected errors (default: 503)")
+    parser.add_argument('--scale', type=int, default=1, help="serve every station this many times (default: 1)")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    options = parser.parse_args()
+
+    if options.source == 'recorded':
+        schema.upgrade_db(options.db or db.DB_NAME)
+        source = RecordedSource(options.db or db.DB_NAME)
+    else:
+        source = SyntheticSource(options.stations, options.seed, options.start)
+    start = options.start if options.start is not None else source.start
+    clock = ReplayClock(start, source.end, options.speed, options.loop)
+
+    server = ThreadingHTTPServer(('127.0.0.1', options.port), make_handler(source, clock, options))
+    print(f"Serving {options.source} payloads on http://127.0.0.1:{options.port} (x{options.speed:g} speed)...")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import sqlite3
+import sys
+import time
+
+import runlength
+
+# Hourly and daily aggregates per station, kept up to date by the scraper.
+#
+# Each rollup row sums the samples of one station over one hour (UTC-aligned, so local hours
+# for whole-hour time zones) or one local day: sample count, availability count / min / max /
+# sum / sum of squares, and capacity count / sum. Means, variances and occupancy over any
+# union of buckets follow from these sums, so long-range reports cost O(buckets), not O(samples).
+# The first time each bucket reached its min and its max is kept too, so a min/max downsampling
+# of the rollups plots every extreme at the time it actually happened.
+
+HOUR = 3600
+DAY = 86400
+PERIODS = {'hour': HOUR, 'day': DAY}
+SAMPLE_TABLES = {'car': 'car_sample', 'bike': 'bike_sample'}
+
+COLUMNS = "n, n_avail, avail_min, avail_max, avail_sum, avail_sumsq, cap_n, cap_sum, avail_min_ts, avail_max_ts"
+
+def create_table(cursor):
+    cursor.execute('''
+        CREATE TABLE rollup (
+            period INTEGER NOT NULL,
+            station_key INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            n_avail INTEGER NOT NULL,
+            avail_min INTEGER,
+            avail_max INTEGER,
+            avail_sum INTEGER NOT NULL,
+            avail_sumsq INTEGER NOT NULL,
+            cap_n INTEGER NOT NULL,
+            cap_sum INTEGER NOT NULL,
+            PRIMARY KEY (period, station_key, bucket)
+        ) WITHOUT ROWID
+    ''')
+
+def add_extreme_times(cursor):
+    cursor.execute("ALTER TABLE rollup ADD COLUMN avail_min_ts INTEGER")
+    cursor.execute("ALTER TABLE rollup ADD COLUMN avail_max_ts INTEGER")
+
+def day_start(ts):
+    """Epoch of the local midnight starting the day of ts."""
+    t = time.localtime(ts)
+    return int(time.mktime((t.tm_year, t.tm_mon, t.tm_mday, 0, 0, 0, 0, 0, -1)))
+
+def _bucket_sql(column, granularity):
+    if granularity == 'day':
+        return f"CAST(strftime('%s', {column}, 'unixepoch', 'localtime', 'start of day', 'utc') AS INTEGER)"
+    return f"({column} - {column} % {HOUR})"
+
+def record(cursor, samples, ts):
+    """Adds one snapshot to the hourly and daily rollups.
+
+    samples: (station_key, available, capacity) tuples, all taken at ts (epoch seconds).
+    """
+    rows = []
+    for period, bucket in ((HOUR, ts - ts % HOUR), (DAY, day_start(ts))):
+        for key, available, capacity in samples:
+            has_avail = available is not None
+            has_cap = capacity is not None
+            rows.append((
+                period, key, bucket, 1,
+                1 if has_avail else 0,
+                available, available,
+                available if has_avail else 0,
+                available * available if has_avail else 0,
+                1 if has_cap else 0,
+                capacity if has_cap else 0,
+                ts if has_avail else None,
+                ts if has_avail else None,
+            ))
+    # SET expressions see the row before the update: the times move only on a strictly new extreme
+    cursor.executemany(f'''
+        INSERT INTO rollup (period, station_key, bucket, {COLUMNS})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (period, station_key, bucket) DO UPDATE SET
+            avail_min_ts = CASE WHEN avail_min IS NULL OR excluded.avail_min < avail_min
+                                THEN excluded.avail_min_ts ELSE avail_min_ts END,
+            avail_max_ts = CASE WHEN avail_max IS NULL OR excluded.avail_max > avail_max
+                                THEN excluded.avail_max_ts ELSE avail_max_ts END,
+            n = n + excluded.n,
+            n_avail = n_avail + excluded.n_avail,
+            avail_min = COALESCE(MIN(avail_min, excluded.avail_min), avail_min, excluded.avail_min),
+            avail_max = COALESCE(MAX(avail_max, excluded.avail_max), avail_max, excluded.avail_max),
+            avail_sum = avail_sum + excluded.avail_sum,
+            avail_sumsq = avail_sumsq + excluded.avail_sumsq,
+            cap_n = cap_n + excluded.cap_n,
+            cap_sum = cap_sum + excluded.cap_sum
+    ''', rows)
+
+def rebuild(cursor, since=0):
+    """Recomputes the rollup rows from the sample tables.
+
+    Buckets before since (the archive horizon, a local midnight) are kept as they are:
+    their samples have left the sample tables.
+    """
+    cursor.execute("DELETE FROM rollup WHERE bucket >= ?", (since,))
+    # The window min / max of each bucket finds the first sample reaching them in the same pass
+    for kind in SAMPLE_TABLES:
+        table = runlength.sample_table(cursor, kind)
+        cursor.execute(f'''
+            INSERT INTO rollup (period, station_key, bucket, {COLUMNS})
+            SELECT {HOUR}, station_key, hour,
+                   COUNT(*), COUNT(available), MIN(available), MAX(available),
+                   COALESCE(SUM(available), 0), COALESCE(SUM(available * available), 0),
+                   COUNT(total), COALESCE(SUM(total), 0),
+                   MIN(CASE WHEN available = low THEN ts END), MIN(CASE WHEN available = high THEN ts END)
+            FROM (
+                SELECT station_key, ts, available, total, ts - ts % {HOUR} AS hour,
+                       MIN(available) OVER w AS low, MAX(available) OVER w AS high
+                FROM {table}
+                WHERE ts >= ?
+                WINDOW w AS (PARTITION BY station_key, ts - ts % {HOUR})
+            )
+            GROUP BY station_key, hour
+        ''', (since,))
+    # Local days are whole hours, so they are built from the hourly rows
+    cursor.execute(f'''
+        INSERT INTO rollup (period, station_key, bucket, {COLUMNS})
+        SELECT {DAY}, station_key, day,
+               SUM(n), SUM(n_avail), MIN(avail_min), MAX(avail_max),
+               SUM(avail_sum), SUM(avail_sumsq), SUM(cap_n), SUM(cap_sum),
+               MIN(CASE WHEN avail_min = low THEN avail_min_ts END),
+               MIN(CASE WHEN avail_max = high THEN avail_max_ts END)
+        FROM (
+            SELECT *, {_bucket_sql('bucket', 'day')} AS day,
+                   MIN(avail_min) OVER w AS low, MAX(avail_max) OVER w AS high
+            FROM rollup
+            WHERE period = {HOUR} AND bucket >= ?
+            WINDOW w AS (PARTITION BY station_key, {_bucket_sql('bucket', 'day')})
+        )
+        GROUP BY station_key, day
+    ''', (since,))
+
+# --- Query layer ---
+
+def _aligned(ts, granularity):
+    if granularity == 'day':
+        return day_start(ts) == ts
+    return ts % HOUR == 0
+
+def choose_source(granularity, start=None, end=None):
+    """Coarsest storage that answers (granularity, [start, end)) exactly: 'day', 'hour' or 'raw'."""
+    candidates = ['day', 'hour'] if granularity == 'day' else ['hour'] if granularity == 'hour' else []
+    for source in candidates:
+        if all(t is None or _aligned(t, source) for t in (start, end)):
+            return source
+    return 'raw'
+
+def aggregate(conn, kind, name, granularity='hour', start=None, end=None):
+    """Aggregates of one station per hour or local day, over [start, end) (epoch seconds, None = open).
+
+    Returns rows (bucket, n, n_avail, avail_min, avail_max, avail_sum, avail_sumsq, cap_n, cap_sum)
+    ordered by bucket, read from the coarsest rollup that answers the request.
+    """
+    source = choose_source(granularity, start, end)
+    params = [kind, name]
+    if source == 'raw':
+        column = "x.ts"
+        query = f'''
+            SELECT {_bucket_sql('x.ts', granularity)} AS b,
+                   COUNT(*), COUNT(x.available), MIN(x.available), MAX(x.available),
+                   COALESCE(SUM(x.available), 0), COALESCE(SUM(x.available * x.available), 0),
+                   COUNT(x.total), COALESCE(SUM(x.total), 0)
+            FROM station s
+            JOIN {runlength.sample_table(conn, kind)} x ON x.station_key = s.station_key
+            WHERE s.kind = ? AND s.name = ?
+        '''
+    else:
+        column = "r.bucket"
+        query = f'''
+            SELECT {_bucket_sql('r.bucket', granularity)} AS b,
+                   SUM(r.n), SUM(r.n_avail), MIN(r.avail_min), MAX(r.avail_max),
+                   SUM(r.avail_sum), SUM(r.avail_sumsq), SUM(r.cap_n), SUM(r.cap_sum)
+            FROM station s
+            JOIN rollup r ON r.station_key = s.station_key AND r.period = {PERIODS[source]}
+            WHERE s.kind = ? AND s.name = ?
+        '''
+    if start is not None:
+        query += f" AND {column} >= ?"
+        params.append(start)
+    if end is not None:
+        query += f" AND {column} < ?"
+        params.append(end)
+    query += " GROUP BY b ORDER BY b"
+    return conn.execute(query, params).fetchall()
+
+def mean_capacity(conn, kind, name, seconds=None):
+    """Mean capacity of a station over its last `seconds` of data (all time if None), None if unknown.
+
+    Read from the hourly rollups of the window (the daily ones for all time): O(buckets).
+    """
+    period = DAY if seconds is None else HOUR
+    query = '''
+        SELECT {} FROM station s
+        JOIN rollup r ON r.station_key = s.station_key AND r.period = ?
+        WHERE s.kind = ? AND s.name = ? AND r.bucket >= ?
+    '''
+    start = 0
+    if seconds is not None:
+        last = conn.execute(query.format("MAX(r.bucket)"), (HOUR, kind, name, 0)).fetchone()[0]
+        if last is None:
+            return None
+        start = last + HOUR - seconds
+    cap_sum, cap_n = conn.execute(query.format("SUM(r.cap_sum), SUM(r.cap_n)"), (period, kind, name, start)).fetchone()
+    return cap_sum / cap_n if cap_n else None
+
+def sample_count(conn, kind):
+    """Number of samples of a kind, summed over the daily rollup."""
+    row = conn.execute('''
+        SELECT COALESCE(SUM(r.n), 0)
+        FROM station s
+        JOIN rollup r ON r.station_key = s.station_key AND r.period = ?
+        WHERE s.kind = ?
+    ''', (DAY, kind)).fetchone()
+    return row[0]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != '--rebuild':
+        print("Usage: python rollup.py --rebuild [db]")
+        sys.exit(1)
+    import archive
+    import db
+    import schema
+    db_name = sys.argv[2] if len(sys.argv) > 2 else db.DB_NAME
+    conn = sqlite3.connect(db_name)
+    schema.migrate(conn)
+    with conn:
+        rebuild(conn.cursor(), archive.get_horizon(conn))
+    count = conn.execute("SELECT COUNT(*) FROM rollup").fetchone()[0]
+    conn.close()
+    print(f"Rollups rebuilt in {db_name}: {count} rows.")
@@ -0,0 +1,255 @@
+import argparse
+import sqlite3
+
+# Change-only ("run-length") storage of the samples.
+#
+# In 'changes' mode the scraper writes a station's row only when its availability, capacity or
+# status differs from the station's latest stored row. Every tick is logged in the tick table and
+# station.last_seen is the heartbeat of each station, so a stored row stands for every tick from
+# its ts until the next row of the station (or last_seen). A station missing from a tick gets an
+# absence row at that tick, which ends its run until its next stored row: gaps survive the
+# compaction. The car_grid / bike_grid views expand the runs back to one row per tick the station
+# was present at; readers go through sample_table(), which only picks them once the database
+# holds change-only rows.
+
+MODES = ('full', 'changes')
+TABLES = {'car': 'car_sample', 'bike': 'bike_sample'}
+GRIDS = {'car': 'car_grid', 'bike': 'bike_grid'}
+VALUE_COLUMNS = {
+    'car': ('available', 'total', 'status'),
+    'bike': ('available', 'free', 'total', 'status'),
+}
+
+def create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE tick (
+            kind TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            PRIMARY KEY (kind, ts)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("ALTER TABLE station ADD COLUMN last_seen INTEGER")
+    log_stored_ticks(cursor)
+    create_views(cursor)
+
+def create_views(cursor):
+    """Absence log and grid views (re)created together: the views read the absences."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS absence (
+            station_key INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            PRIMARY KEY (station_key, ts)
+        ) WITHOUT ROWID
+    ''')
+    for kind, table in TABLES.items():
+        # One row per logged tick and station, holding the latest stored row at that tick,
+        # unless the station went missing since that row
+        columns = ", ".join(f"x.{c}" for c in VALUE_COLUMNS[kind])
+        cursor.execute(f"DROP VIEW IF EXISTS {GRIDS[kind]}")
+        cursor.execute(f'''
+            CREATE VIEW {GRIDS[kind]} AS
+            SELECT g.station_key AS station_key, t.ts AS ts, {columns}
+            FROM station g
+            JOIN tick t ON t.kind = '{kind}' AND t.ts <= g.last_seen
+            JOIN {table} x ON x.station_key = g.station_key
+                AND x.ts = (SELECT MAX(ts) FROM {table} WHERE station_key = g.station_key AND ts <= t.ts)
+            WHERE g.kind = '{kind}'
+                AND NOT EXISTS (SELECT 1 FROM absence a
+                                WHERE a.station_key = g.station_key AND a.ts > x.ts AND a.ts <= t.ts)
+        ''')
+
+def log_stored_ticks(cursor):
+    """Fills the tick log and the heartbeats from full samples written without the scraper."""
+    for kind, table in TABLES.items():
+        cursor.execute(f"INSERT OR IGNORE INTO tick (kind, ts) SELECT DISTINCT '{kind}', ts FROM {table}")
+        cursor.execute(f'''
+            UPDATE station SET last_seen = (SELECT MAX(ts) FROM {table} x WHERE x.station_key = station.station_key)
+            WHERE kind = '{kind}'
+        ''')
+
+def create_legacy_views(cursor, tables):
+    """car_parking / bike_parking, the views with the column names of the original tables, over
+    tables (kind -> sample table or grid view): one row per tick either way."""
+    cursor.execute("DROP VIEW IF EXISTS car_parking")
+    cursor.execute(f'''
+        CREATE VIEW car_parking AS
+        SELECT s.ngsi_id AS id,
+               s.name AS name,
+               c.available AS availableSpotNumber,
+               c.total AS totalSpotNumber,
+               c.status AS status,
+               datetime(c.ts, 'unixepoch', 'localtime') AS timestamp
+        FROM {tables['car']} c
+        JOIN station s ON s.station_key = c.station_key
+    ''')
+    cursor.execute("DROP VIEW IF EXISTS bike_parking")
+    cursor.execute(f'''
+        CREATE VIEW bike_parking AS
+        SELECT s.ngsi_id AS id,
+               s.name AS address,
+               b.available AS availableBikeNumber,
+               b.free AS freeSlotNumber,
+               b.total AS totalSlotNumber,
+               b.status AS status,
+               datetime(b.ts, 'unixepoch', 'localtime') AS timestamp
+        FROM {tables['bike']} b
+        JOIN station s ON s.station_key = b.station_key
+    ''')
+
+def use_change_only(cursor):
+    """Switches the database to change-only storage. The gaps of the rows stored in full so far are
+    logged before they are read as runs, and the compatibility views move to the grids."""
+    log_absences(cursor)
+    cursor.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sample_storage', 'changes')")
+    create_legacy_views(cursor, GRIDS)
+
+def log_absences(cursor):
+    """Logs the gaps of full samples: each station missing from a tick between two of its rows."""
+    for kind, table in TABLES.items():
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO absence (station_key, ts)
+            SELECT station_key, missing FROM (
+                SELECT station_key, next_ts,
+                       (SELECT MIN(t.ts) FROM tick t WHERE t.kind = '{kind}' AND t.ts > x.ts) AS missing
+                FROM (
+                    SELECT station_key, ts, LEAD(ts) OVER (PARTITION BY station_key ORDER BY ts) AS next_ts
+                    FROM {table}
+                ) x
+            )
+            WHERE missing < next_ts
+        ''')
+
+def is_change_only(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'sample_storage'").fetchone()
+    return row is not None and row[0] == 'changes'
+
+def sample_table(conn, kind):
+    """Table or view to read the samples of kind from: one row per tick and station either way."""
+    return GRIDS[kind] if is_change_only(conn) else TABLES[kind]
+
+def latest_values(conn, kind, keys):
+    """station_key -> values of its latest stored row, for the given stations not missing since."""
+    table = TABLES[kind]
+    columns = ", ".join(f"x.{c}" for c in VALUE_COLUMNS[kind])
+    latest = {}
+    for key in keys:
+        row = conn.execute(f'''
+            SELECT {columns} FROM {table} x
+            WHERE x.station_key = ?
+                AND NOT EXISTS (SELECT 1 FROM absence a WHERE a.station_key = x.station_key AND a.ts > x.ts)
+            ORDER BY x.ts DESC LIMIT 1
+        ''', (key,)).fetchone()
+        if row is not None:
+            latest[key] = tuple(row)
+    return latest
+
+def absent_stations(conn, kind):
+    """Keys of the stations of kind logged absent since their latest stored row."""
+    rows = conn.execute(f'''
+        SELECT s.station_key FROM station s
+        WHERE s.kind = ? AND EXISTS (
+            SELECT 1 FROM absence a
+            WHERE a.station_key = s.station_key
+                AND a.ts > (SELECT MAX(x.ts) FROM {TABLES[kind]} x WHERE x.station_key = s.station_key))
+    ''', (kind,)).fetchall()
+    return {row[0] for row in rows}
+
+def changed_rows(conn, kind, rows, unchanged=False):
+    """Keeps the (station_key, ts, *values) rows whose values differ from the station's latest row
+    (every row of a station coming back from a gap).
+
+    unchanged: the payloads equal the previous ones, so only the stations coming back from a gap
+    (e.g. missing from a tick their source was not polled at) can have a row to store.
+    """
+    if unchanged:
+        back = absent_stations(conn, kind)
+        rows = [row for row in rows if row[0] in back]
+    latest = latest_values(conn, kind, [row[0] for row in rows])
+    return [row for row in rows if latest.get(row[0]) != tuple(row[2:])]
+
+def record_tick(cursor, kind, keys, ts, mode='full'):
+    """Logs the tick and the heartbeat of the stations seen in it.
+
+    mode 'changes' switches the database to change-only storage. Once it is change-only (whatever
+    the mode of this scraper), the stations of kind seen before but missing from this tick get an
+    absence row, unless they are already missing since their last heartbeat.
+    """
+    change_only = is_change_only(cursor)
+    if mode == 'changes' and not change_only:
+        use_change_only(cursor)
+        change_only = True
+    if change_only:
+        seen = set(keys)
+        missing = cursor.execute('''
+            SELECT station_key FROM station s
+            WHERE kind = ? AND last_seen < ?
+                AND NOT EXISTS (SELECT 1 FROM absence a WHERE a.station_key = s.station_key AND a.ts > s.last_seen)
+        ''', (kind, ts)).fetchall()
+        cursor.executemany("INSERT OR IGNORE INTO absence (station_key, ts) VALUES (?, ?)",
+                           [(key, ts) for key, in missing if key not in seen])
+    cursor.execute("INSERT OR IGNORE INTO tick (kind, ts) VALUES (?, ?)", (kind, ts))
+    cursor.executemany("UPDATE station SET last_seen = MAX(COALESCE(last_seen, 0), ?) WHERE station_key = ?",
+                       [(ts, key) for key in keys])
+
+def carry_forward(cursor, horizon):
+    """Before rows older than horizon are dropped, restamps each station's row in effect at horizon.
+
+    Stations missing at horizon have no row in effect: they stay absent until their next row.
+    """
+    for kind, table in TABLES.items():
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {table} (station_key, ts, {", ".join(VALUE_COLUMNS[kind])})
+            SELECT x.station_key, ?, {", ".join(f"x.{c}" for c in VALUE_COLUMNS[kind])}
+            FROM station s
+            JOIN {table} x ON x.station_key = s.station_key
+                AND x.ts = (SELECT MAX(ts) FROM {table} WHERE station_key = s.station_key AND ts < ?)
+            WHERE s.kind = ?
+                AND NOT EXISTS (SELECT 1 FROM absence a
+                                WHERE a.station_key = s.station_key AND a.ts > x.ts AND a.ts <= ?)
+        ''', (horizon, horizon, kind, horizon))
+
+def compact(conn):
+    """Switches an existing database to change-only storage: drops every row equal to the previous one.
+
+    The gaps of the full rows are logged first; a row after a gap is kept, as it starts a new run.
+    """
+    removed = 0
+    with conn:
+        if not is_change_only(conn):
+            use_change_only(conn.cursor())
+        for kind, table in TABLES.items():
+            same = " AND ".join(f"{c} IS prev_{c}" for c in VALUE_COLUMNS[kind])
+            previous = ", ".join(f"LAG({c}) OVER w AS prev_{c}" for c in VALUE_COLUMNS[kind])
+            cursor = conn.execute(f'''
+                DELETE FROM {table} WHERE (station_key, ts) IN (
+                    SELECT station_key, ts FROM (
+                        SELECT station_key, ts, {", ".join(VALUE_COLUMNS[kind])},
+                               LAG(ts) OVER w AS prev_ts, {previous}
+                        FROM {table}
+                        WINDOW w AS (PARTITION BY station_key ORDER BY ts)
+                    ) x
+                    WHERE prev_ts IS NOT NULL AND {same}
+                        AND NOT EXISTS (SELECT 1 FROM absence a
+                                        WHERE a.station_key = x.station_key AND a.ts > x.prev_ts AND a.ts <= x.ts)
+                )
+            ''')
+            removed += cursor.rowcount
+    return removed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the samples to change-only storage.")
+    parser.add_argument('--compact', action='store_true', help="drop every sample equal to the previous one")
+    parser.add_argument('--vacuum', action='store_true', help="shrink the database file afterwards")
+    args = parser.parse_args()
+    if not args.compact:
+        parser.error("nothing to do (use --compact)")
+
+    import db
+    import schema
+    conn = sqlite3.connect(db.DB_NAME)
+    schema.migrate(conn)
+    removed = compact(conn)
+    if args.vacuum:
+        conn.execute("VACUUM")
+    conn.close()
+    print(f"{removed} repeated samples removed from {db.DB_NAME}.")
@@ -0,0 +1,218 @@
+import sqlite3
+import sys
+
+import db
+import metrics
+import moments
+import rollup
+import runlength
+
+# Each migration brings the database from version i to i + 1.
+# The current version is stored in PRAGMA user_version (0 for a fresh or legacy file).
+
+def _create_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS car_parking (
+            id TEXT,
+            name TEXT,
+            availableSpotNumber INTEGER,
+            totalSpotNumber INTEGER,
+            status TEXT,
+            timestamp DATETIME
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bike_parking (
+            id TEXT,
+            address TEXT,
+            availableBikeNumber INTEGER,
+            freeSlotNumber INTEGER,
+            totalSlotNumber INTEGER,
+            status TEXT,
+            timestamp DATETIME
+        )
+    ''')
+
+def _create_indexes(cursor):
+    # Per-station series (view_data, analyse) and time range scans (check_dates)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_car_parking_name_ts ON car_parking (name, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bike_parking_address_ts ON bike_parking (address, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_car_parking_ts ON car_parking (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_bike_parking_ts ON bike_parking (timestamp)")
+
+def _normalize_storage(cursor):
+    # Station dimension: one small integer key per (kind, id, name) instead of repeating the text on every row.
+    # name holds the car park name or the bike station address.
+    cursor.execute('''
+        CREATE TABLE station (
+            station_key INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            ngsi_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            UNIQUE (kind, ngsi_id, name)
+        )
+    ''')
+
+    # Fact tables clustered on (station, time), timestamps as integer epoch seconds
+    cursor.execute('''
+        CREATE TABLE car_sample (
+            station_key INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            available INTEGER,
+            total INTEGER,
+            status TEXT,
+            PRIMARY KEY (station_key, ts)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE bike_sample (
+            station_key INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            available INTEGER,
+            free INTEGER,
+            total INTEGER,
+            status TEXT,
+            PRIMARY KEY (station_key, ts)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX idx_car_sample_ts ON car_sample (ts)")
+    cursor.execute("CREATE INDEX idx_bike_sample_ts ON bike_sample (ts)")
+
+    # One-shot conversion of the legacy tables. Their timestamps are local datetime.now() strings.
+    cursor.execute('''
+        INSERT OR IGNORE INTO station (kind, ngsi_id, name)
+        SELECT DISTINCT 'car', COALESCE(id, ''), COALESCE(name, '') FROM car_parking
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO station (kind, ngsi_id, name)
+        SELECT DISTINCT 'bike', COALESCE(id, ''), COALESCE(address, '') FROM bike_parking
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO car_sample (station_key, ts, available, total, status)
+        SELECT s.station_key, CAST(strftime('%s', c.timestamp, 'utc') AS INTEGER),
+               c.availableSpotNumber, c.totalSpotNumber, c.status
+        FROM car_parking c
+        JOIN station s ON s.kind = 'car' AND s.ngsi_id = COALESCE(c.id, '') AND s.name = COALESCE(c.name, '')
+        WHERE c.timestamp IS NOT NULL
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO bike_sample (station_key, ts, available, free, total, status)
+        SELECT s.station_key, CAST(strftime('%s', b.timestamp, 'utc') AS INTEGER),
+               b.availableBikeNumber, b.freeSlotNumber, b.totalSlotNumber, b.status
+        FROM bike_parking b
+        JOIN station s ON s.kind = 'bike' AND s.ngsi_id = COALESCE(b.id, '') AND s.name = COALESCE(b.address, '')
+        WHERE b.timestamp IS NOT NULL
+    ''')
+    cursor.execute("DROP TABLE car_parking")
+    cursor.execute("DROP TABLE bike_parking")
+
+    # Compatibility views with the old column names, so existing queries keep working
+    runlength.create_legacy_views(cursor, runlength.TABLES)
+
+def _create_station_match(cursor):
+    # Key/value store for bookkeeping (e.g. which station catalogue a cached result was built from)
+    cursor.execute('''
+        CREATE TABLE meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    # Car park <-> bike station pairs computed by matching.py
+    cursor.execute('''
+        CREATE TABLE station_match (
+            car_name TEXT PRIMARY KEY,
+            bike_name TEXT NOT NULL
+        )
+    ''')
+
+def _create_rollup(cursor):
+    # Hourly / daily aggregates per station, filled from the existing samples by _rollup_extreme_times
+    rollup.create_table(cursor)
+
+def _create_pair_moments(cursor):
+    # Streaming correlation state per matched car park / bike station pair
+    moments.create_table(cursor)
+    moments.rebuild(cursor.connection, commit=False)
+
+def _create_metric(cursor):
+    metrics.create_table(cursor)
+
+def _create_tick_log(cursor):
+    runlength.create_tables(cursor)
+
+def _rollup_extreme_times(cursor):
+    # Times of each bucket's min and max: recomputed from the samples still in SQLite
+    # (buckets of archived days keep NULL times)
+    rollup.add_extreme_times(cursor)
+    row = cursor.execute("SELECT value FROM meta WHERE key = 'archive_horizon'").fetchone()
+    rollup.rebuild(cursor, int(row[0]) if row else 0)
+
+def _log_absences(cursor):
+    # Absence log read by the grid views; aggregates read from the grid are recomputed with them
+    runlength.create_views(cursor)
+    if runlength.is_change_only(cursor):
+        runlength.create_legacy_views(cursor, runlength.GRIDS)
+        row = cursor.execute("SELECT value FROM meta WHERE key = 'archive_horizon'").fetchone()
+        horizon = int(row[0]) if row else 0
+        rollup.rebuild(cursor, horizon)
+        moments.rebuild(cursor.connection, commit=False, since=horizon)
+
+MIGRATIONS = [
+    _create_tables,
+    _create_indexes,
+    _normalize_storage,
+    _create_station_match,
+    _create_rollup,
+    _create_pair_moments,
+    _create_metric,
+    _create_tick_log,
+    _rollup_extreme_times,
+    _log_absences,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+NORMALIZED_VERSION = 3  # first version with the station / *_sample layout
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Applies the missing migrations, each one in its own transaction. Returns the final version."""
+    version = get_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this code ({SCHEMA_VERSION}).")
+
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            MIGRATIONS[target - 1](cursor)
+            cursor.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    # The conversion leaves the legacy pages free inside the file, give them back to the disk
+    if version < NORMALIZED_VERSION <= SCHEMA_VERSION:
+        conn.execute("VACUUM")
+    return get_version(conn)
+
+def upgrade_db(db_name=None):
+    conn = sqlite3.connect(db_name or db.DB_NAME)
+    try:
+        return migrate(conn)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    db_name = sys.argv[1] if len(sys.argv) > 1 else db.DB_NAME
+    conn = sqlite3.connect(db_name)
+    before = get_version(conn)
+    after = migrate(conn)
+    conn.close()
+    if before == after:
+        print(f"{db_name} is already at schema version {after}.")
+    else:
+        print(f"{db_name} upgraded from schema version {before} to {after}.")
@@ -1,92 +1,510 @@
 import requests
 import json
+import os
 import sqlite3
 import time
+import math
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as futures_wait
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-DB_NAME = "parking_data.db"
+import db
+import metrics
+import moments
+import rollup
+import runlength
+import schema
+
+try:
+    import orjson  # optional, decodes the NGSI payloads several times faster than json
+except ImportError:
+    orjson = None
+
+# PARKING_API_URL or --base-url points the scraper at another server, e.g. replay_server.py
+BASE_URL = os.environ.get("PARKING_API_URL", "https://portail-api-data.montpellier3m.fr").rstrip('/')
+CAR_URL = f"{BASE_URL}/offstreetparking"
+BIKE_URL = f"{BASE_URL}/bikestation"
+
+INTERVAL = 60  # seconds between two snapshots (timestamps are stored to the second)
+MIN_INTERVAL = 1  # shorter intervals would stamp two snapshots with the same second
+TIMEOUT = (5, 20)  # (connect, read) in seconds
+RETRIES = 3
+BACKOFF = 0.5  # waits 0.5s, 1s, 2s between retries
+COMMIT_EVERY = 1  # snapshots per transaction, raise it for sub-minute intervals
+STORAGE = 'full'  # or 'changes': store a station's row only when it differs from its previous one
+WORKERS = 4  # concurrent fetches
+
+METRICS = metrics.Metrics(counters=('errors', 'errors_car', 'errors_bike', 'tick_overruns',
+                                     'unchanged_car', 'unchanged_bike'))
+
+def set_base_url(base_url):
+    global BASE_URL, CAR_URL, BIKE_URL
+    BASE_URL = base_url.rstrip('/')
+    CAR_URL = f"{BASE_URL}/offstreetparking"
+    BIKE_URL = f"{BASE_URL}/bikestation"
 
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS car_parking (
-            id TEXT,
-            name TEXT,
-            availableSpotNumber INTEGER,
-            totalSpotNumber INTEGER,
-            status TEXT,
-            timestamp DATETIME
-        )
-    ''')
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS bike_parking (
-            id TEXT,
-            address TEXT,
-            availableBikeNumber INTEGER,
-            freeSlotNumber INTEGER,
-            totalSlotNumber INTEGER,
-            status TEXT,
-            timestamp DATETIME
-        )
-    ''')
-    
-    conn.commit()
+    conn = sqlite3.connect(db.DB_NAME)
+    schema.migrate(conn)
     conn.close()
 
-def scrape_and_save():
-    conn = sqlite3.connect(DB_NAME)
+def create_session(pool_size=WORKERS):
+    # Pooled keep-alive connections, reused from tick to tick
+    retries = Retry(
+        total=RETRIES,
+        backoff_factor=BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retries)
+    session = requests.Session()
+    session.headers['Accept-Encoding'] = 'gzip, deflate'  # decompressed transparently by requests
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+class Payload:
+    """Last 200 response of an endpoint: its validators, raw body and rows."""
+
+    def __init__(self):
+        self.etag = None
+        self.last_modified = None
+        self.content = None
+        self.rows = None
+
+PAYLOADS = {}  # url -> Payload, for conditional requests
+
+decode_json = orjson.loads if orjson is not None else json.loads
+
+def fetch_rows(session, url, build, label=None):
+    """(rows, changed) of the endpoint, or (None, True) on an HTTP error.
+
+    The request carries the ETag / Last-Modified of the previous response. On a 304, or a body
+    identical to the previous one, the previous rows are returned as unchanged without decoding.
+    """
+    label = label or url
+    payload = PAYLOADS.setdefault(url, Payload())
+    headers = {}
+    if payload.rows is not None:
+        if payload.etag:
+            headers['If-None-Match'] = payload.etag
+        if payload.last_modified:
+            headers['If-Modified-Since'] = payload.last_modified
+    with METRICS.span(f"http_{label}"):
+        response = session.get(url, headers=headers, timeout=TIMEOUT)
+    if response.status_code == 304 and payload.rows is not None:
+        METRICS.count(f"unchanged_{label}")
+        return payload.rows, False
+    if response.status_code != 200:
+        print(f"Unexpected status {response.status_code} from {url}")
+        METRICS.count(f"errors_{label}")
+        return None, True
+
+    # Bytes on the wire (compressed when the server gzips), the body is already decompressed
+    METRICS.count(f"bytes_{label}", int(response.headers.get('Content-Length') or len(response.content)))
+    payload.etag = response.headers.get('ETag')
+    payload.last_modified = response.headers.get('Last-Modified')
+    if payload.rows is not None and response.content == payload.content:
+        METRICS.count(f"unchanged_{label}")
+        return payload.rows, False
+    with METRICS.span(f"decode_{label}"):
+        data = decode_json(response.content)
+    with METRICS.span(f"build_{label}"):
+        rows = build(data)
+    payload.content, payload.rows = response.content, rows
+    return rows, True
+
+def fetch_all(session, executor, urls, builders, labels=None):
+    """Fetches every url concurrently and returns the (rows, changed) of each in the same order.
+
+    builders turn each decoded payload into rows; labels name the endpoints in the metrics (default: the urls).
+    Rows are None when an endpoint failed.
+    """
+    labels = labels or urls
+    futures = [executor.submit(fetch_rows, session, url, build, label)
+               for url, build, label in zip(urls, builders, labels)]
+    results = []
+    for url, label, future in zip(urls, labels, futures):
+        try:
+            results.append(future.result())
+        except (requests.RequestException, ValueError) as e:
+            print(f"Error fetching {url}: {e}")
+            METRICS.count(f"errors_{label}")
+            results.append((None, True))
+    return results
+
+# --- Field extraction ---
+#
+# Each endpoint's fields are dotted paths into one NGSI item ("name.value"), turned once into
+# getters; a row builder applies them to every item to emit the insert tuples (id, name, values...).
+# The first two fields (id, name) are text and default to ''.
+
+CAR_FIELDS = ('id', 'name.value', 'availableSpotNumber.value', 'totalSpotNumber.value', 'status.value')
+BIKE_FIELDS = ('id', 'address.value', 'availableBikeNumber.value', 'freeSlotNumber.value',
+               'totalSlotNumber.value', 'status.value')
+
+def street_address(address_info):
+    return address_info.get('streetAddress') if isinstance(address_info, dict) else str(address_info)
+
+def field_getter(path, convert=None, text=False):
+    """item -> value at the dotted path (None when a key is missing), passed through convert."""
+    keys = tuple(path.split('.'))
+    def get(item):
+        value = item
+        for key in keys:
+            value = (value or {}).get(key)
+        if convert is not None:
+            value = convert(value)
+        return (value or '') if text else value
+    return get
+
+def row_builder(paths, converters=None):
+    """rows(items) -> [tuple of the fields of each item]; converters maps a field position to a function."""
+    converters = converters or {}
+    getters = tuple(field_getter(path, converters.get(i), text=i < 2) for i, path in enumerate(paths))
+    def build(items):
+        return [tuple([get(item) for get in getters]) for item in items]
+    return build
+
+build_car_rows = row_builder(CAR_FIELDS)
+build_bike_rows = row_builder(BIKE_FIELDS, {1: street_address})
+
+def get_station_keys(conn, kind, rows):
+    """Maps (id, name) -> station_key for the stations of this snapshot, registering the new ones."""
     cursor = conn.cursor()
-    timestamp = datetime.now()
+    cursor.execute("SELECT ngsi_id, name, station_key FROM station WHERE kind = ?", (kind,))
+    keys = {(ngsi_id, name): key for ngsi_id, name, key in cursor.fetchall()}
+
+    missing = {(row[0], row[1]) for row in rows} - keys.keys()
+    if missing:
+        cursor.executemany("INSERT OR IGNORE INTO station (kind, ngsi_id, name) VALUES (?, ?, ?)",
+                           [(kind, ngsi_id, name) for ngsi_id, name in sorted(missing)])
+        cursor.execute("SELECT ngsi_id, name, station_key FROM station WHERE kind = ?", (kind,))
+        keys = {(ngsi_id, name): key for ngsi_id, name, key in cursor.fetchall()}
+    return keys
+
+def save_rows(conn, car_rows, bike_rows, ts, storage=STORAGE, unchanged=()):
+    """Writes one snapshot under ts; unchanged lists the kinds whose rows equal the previous snapshot's."""
+    cursor = conn.cursor()
+    if car_rows:
+        keys = get_station_keys(conn, 'car', car_rows)
+        samples = [(keys[(r[0], r[1])], ts) + r[2:] for r in car_rows]
+        if storage == 'changes':
+            samples = runlength.changed_rows(conn, 'car', samples, 'car' in unchanged)
+        cursor.executemany('''
+            INSERT OR IGNORE INTO car_sample (station_key, ts, available, total, status)
+            VALUES (?, ?, ?, ?, ?)
+        ''', samples)
+        runlength.record_tick(cursor, 'car', [keys[(r[0], r[1])] for r in car_rows], ts, storage)
+        rollup.record(cursor, [(keys[(r[0], r[1])], r[2], r[3]) for r in car_rows], ts)
+        car_values = {keys[(r[0], r[1])]: r[2] for r in car_rows}
+    if bike_rows:
+        keys = get_station_keys(conn, 'bike', bike_rows)
+        samples = [(keys[(r[0], r[1])], ts) + r[2:] for r in bike_rows]
+        if storage == 'changes':
+            samples = runlength.changed_rows(conn, 'bike', samples, 'bike' in unchanged)
+        cursor.executemany('''
+            INSERT OR IGNORE INTO bike_sample (station_key, ts, available, free, total, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', samples)
+        runlength.record_tick(cursor, 'bike', [keys[(r[0], r[1])] for r in bike_rows], ts, storage)
+        rollup.record(cursor, [(keys[(r[0], r[1])], r[2], r[4]) for r in bike_rows], ts)
+        bike_values = {keys[(r[0], r[1])]: r[2] for r in bike_rows}
+    if car_rows and bike_rows:
+        # Both endpoints share the tick timestamp, so this snapshot is one (car, bike) point per pair
+        pairs = [(car_key, bike_key) for car_key, bike_key, _, _ in moments.pair_keys(conn, commit=False)]
+        moments.record(cursor, pairs, car_values, bike_values, ts)
+
+def open_db():
+    return db.connect()
+
+# --- Sources ---
+#
+# A source is one endpoint: its URL, the field mapping that turns its items into rows, the
+# sample table the rows go to (kind) and its polling interval. Several sources can feed the
+# same table, e.g. the car parks of two operators; their stations are told apart by ngsi_id.
+
+class Source:
+    def __init__(self, name, url, kind, build, interval=INTERVAL):
+        if kind not in runlength.TABLES:
+            raise ValueError(f"Unknown kind {kind!r} for source {name!r} (expected one of {sorted(runlength.TABLES)})")
+        if interval < MIN_INTERVAL:
+            raise ValueError(f"Interval of source {name!r} is {interval:g}s, at least {MIN_INTERVAL}s is needed")
+        self.name = name
+        self.url = url
+        self.kind = kind
+        self.build = build
+        self.interval = interval
+
+    def __repr__(self):
+        return f"Source({self.name!r}, {self.url!r}, {self.kind!r}, interval={self.interval:g})"
+
+SOURCES = {}  # name -> Source, polled by run()
+BUILDERS = {'car': build_car_rows, 'bike': build_bike_rows}
+
+def register(name, url, kind, build=None, interval=INTERVAL):
+    """Adds a source to the registry; build defaults to the Montpellier mapping of kind."""
+    SOURCES[name] = Source(name, url, kind, build or BUILDERS.get(kind), interval)
+    return SOURCES[name]
+
+def default_sources(interval=INTERVAL):
+    return [Source('car', CAR_URL, 'car', build_car_rows, interval),
+            Source('bike', BIKE_URL, 'bike', build_bike_rows, interval)]
+
+def load_sources(path, interval=INTERVAL):
+    """Registers the sources of a JSON file, a list of objects such as
+
+        {"name": "tam_car", "url": "https://.../offstreetparking", "kind": "car", "interval": 120,
+         "fields": ["id", "name.value", "free.value", "capacity.value", "state.value"]}
+
+    fields are dotted paths to (id, name, *runlength.VALUE_COLUMNS[kind]); without them the
+    Montpellier mapping of kind is used. interval defaults to the --interval option.
+    """
+    with open(path) as f:
+        specs = json.load(f)
+    for spec in specs:
+        missing = [key for key in ('name', 'url', 'kind') if key not in spec]
+        if missing:
+            raise ValueError(f"Source {spec.get('name', spec)!r} in {path} lacks {', '.join(missing)}")
+        if spec['kind'] not in runlength.TABLES:
+            raise ValueError(f"Unknown kind {spec['kind']!r} for source {spec['name']!r} "
+                             f"(expected one of {sorted(runlength.TABLES)})")
+        build = None
+        if 'fields' in spec:
+            fields = spec['fields']
+            expected = 2 + len(runlength.VALUE_COLUMNS[spec['kind']])
+            if len(fields) != expected or not all(isinstance(field, str) for field in fields):
+                raise ValueError(f"Source {spec['name']!r} needs {expected} dotted field paths, got {fields!r}")
+            build = row_builder(fields)
+        register(spec['name'], spec['url'], spec['kind'], build, spec.get('interval', interval))
+
+# --- Writing snapshots ---
+
+def save_results(conn, sources, results, ts, storage=STORAGE):
+    """Writes the (rows, changed) fetched from each source as the snapshot ts; returns the rows per kind."""
+    rows = {kind: [] for kind in runlength.TABLES}
+    changed = {kind: False for kind in runlength.TABLES}
+    for source, (source_rows, source_changed) in zip(sources, results):
+        rows[source.kind].extend(source_rows or [])
+        changed[source.kind] = changed[source.kind] or source_changed
+        METRICS.count(f"records_{source.name}", len(source_rows or []))
+    unchanged = [kind for kind in runlength.TABLES if not changed[kind]]
+    with METRICS.span('insert'):
+        save_rows(conn, rows['car'], rows['bike'], ts, storage, unchanged)
+    return rows
+
+def scrape_and_save(session=None, executor=None, timestamp=None, conn=None, commit=True, storage=STORAGE,
+                    sources=None):
+    """Fetches one snapshot of every source (default: both Montpellier endpoints) and writes it under
+    timestamp (epoch seconds, default: now)."""
+    sources = sources or default_sources()
+    own_session = session is None
+    own_executor = executor is None
+    own_conn = conn is None
+    if own_session:
+        session = create_session()
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=len(sources))
+    if own_conn:
+        conn = open_db()
+    if timestamp is None:
+        timestamp = int(time.time())
 
     try:
-        # Car Parking
-        print(f"Scraping car parking data at {timestamp}...")
-        response_car = requests.get("https://portail-api-data.montpellier3m.fr/offstreetparking")
-        if response_car.status_code == 200:
-            data_car = response_car.json()
-            for item in data_car:
-                name = item.get('name', {}).get('value')
-                available = item.get('availableSpotNumber', {}).get('value')
-                total = item.get('totalSpotNumber', {}).get('value')
-                status = item.get('status', {}).get('value')
-                
-                cursor.execute('''
-                    INSERT INTO car_parking (id, name, availableSpotNumber, totalSpotNumber, status, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (item.get('id'), name, available, total, status, timestamp))
-        
-        # Bike Parking
-        print(f"Scraping bike parking data at {timestamp}...")
-        response_bike = requests.get("https://portail-api-data.montpellier3m.fr/bikestation")
-        if response_bike.status_code == 200:
-            data_bike = response_bike.json()
-            for item in data_bike:
-                address_info = item.get('address', {}).get('value')
-                address = address_info.get('streetAddress') if isinstance(address_info, dict) else str(address_info)
-                available_bikes = item.get('availableBikeNumber', {}).get('value')
-                free_slots = item.get('freeSlotNumber', {}).get('value')
-                total_slots = item.get('totalSlotNumber', {}).get('value')
-                status = item.get('status', {}).get('value')
-
-                cursor.execute('''
-                    INSERT INTO bike_parking (id, address, availableBikeNumber, freeSlotNumber, totalSlotNumber, status, timestamp)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (item.get('id'), address, available_bikes, free_slots, total_slots, status, timestamp))
-        
-        conn.commit()
-        print("Data saved successfully.")
-        
+        print(f"Scraping {', '.join(source.name for source in sources)} at {datetime.fromtimestamp(timestamp)}...")
+        with METRICS.span('tick'):
+            results = fetch_all(session, executor, [s.url for s in sources], [s.build for s in sources],
+                                [s.name for s in sources])
+            write_snapshot(conn, sources, results, timestamp, commit or own_conn, storage)
+    finally:
+        # The timings of this tick are written with the next commit
+        METRICS.save(conn, timestamp)
+        if own_conn:
+            conn.commit()
+            conn.close()
+        if own_executor:
+            executor.shutdown()
+        if own_session:
+            session.close()
+
+def write_snapshot(conn, sources, results, ts, commit, storage=STORAGE):
+    # One savepoint per snapshot inside the batch transaction: a failed snapshot is undone
+    # without dropping the ones still waiting for the batched commit
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    conn.execute("SAVEPOINT snap")
+    try:
+        try:
+            rows = save_results(conn, sources, results, ts, storage)
+        except Exception:
+            conn.execute("ROLLBACK TO snap")
+            raise
+        finally:
+            conn.execute("RELEASE snap")
+        counts = ", ".join(f"{len(rows[kind])} {kind}" for kind in runlength.TABLES)
+        if commit:
+            with METRICS.span('commit'):
+                conn.commit()
+            print(f"Data saved successfully ({counts} rows).")
+        else:
+            print(f"Data queued ({counts} rows).")
     except Exception as e:
         print(f"Error occurred: {e}")
+        METRICS.count('errors')
+        # The payloads of this tick may not be stored: decode the next ones in full
+        PAYLOADS.clear()
+
+# --- Scheduler ---
+
+def next_tick(interval, now=None):
+    """Next wall-clock boundary that is a multiple of interval (e.g. the next full minute)."""
+    if now is None:
+        now = time.time()
+    return (math.floor(now / interval) + 1) * interval
+
+class Snapshot:
+    """The fetches of the sources due at one tick; written together once they have all finished."""
+
+    def __init__(self, ts):
+        self.ts = ts
+        self.started = time.perf_counter()
+        self.sources = []
+        self.results = []
+        self.pending = 0
+
+class Scheduler:
+    """Polls each source on its own interval through a bounded pool of fetch workers.
+
+    Fetching and decoding run in the pool; the database is written from the scheduler thread.
+    Sources due at the same boundary share the snapshot timestamp, so a car and a bike source
+    on the same interval still give one (car, bike) point per pair and tick.
+
+    Backpressure: a source whose previous fetch has not finished skips its tick, and so does
+    any source once max_pending fetches are in flight, so a slow source never queues work
+    that would delay the others.
+    """
+
+    def __init__(self, sources, executor, max_pending):
+        self.sources = sources
+        self.executor = executor
+        self.max_pending = max_pending
+        self.due = {source.name: next_tick(source.interval) for source in sources}
+        self.busy = set()       # names of the sources being fetched
+        self.in_flight = {}     # future -> (snapshot, source)
+        self.snapshots = {}     # ts -> Snapshot still waiting for fetches
+
+    def submit_due(self, session, now):
+        for source in self.sources:
+            due = self.due[source.name]
+            if due > now:
+                continue
+            following = next_tick(source.interval, now)
+            missed = round((following - due) / source.interval) - 1
+            if missed > 0:
+                print(f"{source.name}: late by more than {source.interval:g}s, skipping {missed} tick(s).")
+            self.due[source.name] = following
+
+            if source.name in self.busy:
+                print(f"{source.name}: previous fetch still running, skipping this tick.")
+                METRICS.count(f"skipped_{source.name}")
+                continue
+            if len(self.in_flight) >= self.max_pending:
+                print(f"{source.name}: {len(self.in_flight)} fetches in flight, skipping this tick.")
+                METRICS.count(f"skipped_{source.name}")
+                continue
+
+            ts = math.floor(due)  # boundaries at least a second apart never share a timestamp
+            snapshot = self.snapshots.setdefault(ts, Snapshot(ts))
+            snapshot.pending += 1
+            self.busy.add(source.name)
+            future = self.executor.submit(fetch_rows, session, source.url, source.build, source.name)
+            self.in_flight[future] = (snapshot, source)
+
+    def wait(self):
+        """Waits until a fetch finishes or the next source is due; returns the finished snapshots."""
+        timeout = max(0.0, min(self.due.values()) - time.time())
+        if not self.in_flight:
+            time.sleep(timeout)
+            return []
+        done, _ = futures_wait(self.in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        finished = []
+        for future in done:
+            snapshot, source = self.in_flight.pop(future)
+            self.busy.discard(source.name)
+            try:
+                result = future.result()
+            except (requests.RequestException, ValueError) as e:
+                print(f"Error fetching {source.url}: {e}")
+                METRICS.count(f"errors_{source.name}")
+                result = (None, True)
+            snapshot.sources.append(source)
+            snapshot.results.append(result)
+            snapshot.pending -= 1
+            if snapshot.pending == 0:
+                finished.append(self.snapshots.pop(snapshot.ts))
+        return sorted(finished, key=lambda snapshot: snapshot.ts)
+
+def run(interval=INTERVAL, commit_every=COMMIT_EVERY, metrics_file=None, storage=STORAGE,
+        workers=WORKERS, max_pending=None):
+    """Polls the registered sources (default: both Montpellier endpoints every interval seconds)."""
+    init_db()
+    sources = list(SOURCES.values()) or default_sources(interval)
+    session = create_session(workers)
+    conn = open_db()
+    pending = 0
+    for source in sources:
+        print(f"Polling {source.name} ({source.kind}) every {source.interval:g}s from {source.url}")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            scheduler = Scheduler(sources, executor, max_pending or 2 * workers)
+            while True:
+                scheduler.submit_due(session, time.time())
+                for snapshot in scheduler.wait():
+                    # Each snapshot is stamped with its scheduled tick, not with the time the work
+                    # finished, so the sampling period does not drift.
+                    pending += 1
+                    commit = pending >= commit_every
+                    write_snapshot(conn, snapshot.sources, snapshot.results, snapshot.ts, commit, storage)
+                    if commit:
+                        pending = 0
+                    seconds = time.perf_counter() - snapshot.started
+                    METRICS.observe('tick', seconds)
+                    METRICS.save(conn, snapshot.ts)
+
+                    metrics.check_overrun(METRICS, seconds, min(source.interval for source in snapshot.sources))
+                    if metrics_file:
+                        METRICS.write_prometheus(metrics_file)
     finally:
+        # Do not lose the snapshots of an unfinished batch on Ctrl+C
+        conn.commit()
         conn.close()
+        session.close()
 
 if __name__ == "__main__":
-    init_db()
-    while True:
-        scrape_and_save()
-        print("Waiting for 1 minute...")
-        time.sleep(60)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape Montpellier car and bike parking availability.")
+    parser.add_argument('--interval', type=float, default=INTERVAL,
+                        help=f"seconds between snapshots, aligned on the clock (default: {INTERVAL})")
+    parser.add_argument('--commit-every', type=int, default=COMMIT_EVERY,
+                        help=f"number of snapshots written per transaction (default: {COMMIT_EVERY})")
+    parser.add_argument('--metrics-file', default=None,
+                        help="write the stage timings and counters to this Prometheus text file after each tick")
+    parser.add_argument('--storage', choices=runlength.MODES, default=STORAGE,
+                        help="'changes' writes a station's row only when its values change (default: full)")
+    parser.add_argument('--base-url', default=BASE_URL,
+                        help=f"server of the offstreetparking / bikestation endpoints (default: {BASE_URL})")
+    parser.add_argument('--sources', default=None,
+                        help="JSON file of the sources to poll instead of the two Montpellier endpoints")
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help=f"concurrent fetches (default: {WORKERS})")
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help="fetches in flight before due sources skip their tick (default: 2 x workers)")
+    args = parser.parse_args()
+    if args.interval < MIN_INTERVAL:
+        parser.error(f"--interval must be at least {MIN_INTERVAL}s: snapshots are keyed on whole seconds")
+    set_base_url(args.base_url)
+    if args.sources:
+        load_sources(args.sources, args.interval)
+    run(args.interval, max(1, args.commit_every), args.metrics_file, args.storage, max(1, args.workers),
+        args.max_pending)
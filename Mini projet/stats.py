@@ -0,0 +1,236 @@
+import numpy as np
+
+# Statistiques vectorisées partagées par DM1/main.py et analyse.py.
+# Toutes les fonctions acceptent des listes ou des tableaux NumPy ; None et NaN sont ignorés.
+# Les variances et covariances sont "population" (division par n), comme dans DM1.
+
+def as_array(data):
+    """Convertit en tableau de flottants, None devient NaN."""
+    return np.asarray(data if isinstance(data, np.ndarray) else list(data), dtype=float)
+
+def mean(data):
+    x = as_array(data)
+    x = x[np.isfinite(x)]
+    if x.size == 0:
+        return 0.0
+    return float(x.mean())
+
+def variance(data):
+    x = as_array(data)
+    x = x[np.isfinite(x)]
+    if x.size == 0:
+        return 0.0
+    return float(np.mean((x - x.mean()) ** 2))
+
+def std(data):
+    return float(np.sqrt(variance(data)))
+
+def _paired(x, y):
+    x = as_array(x)
+    y = as_array(y)
+    if x.shape != y.shape:
+        raise ValueError("Les deux séries doivent avoir la même longueur.")
+    mask = np.isfinite(x) & np.isfinite(y)
+    return x[mask], y[mask]
+
+def covariance(x, y):
+    x, y = _paired(x, y)
+    if x.size == 0:
+        return 0.0
+    return float(np.mean((x - x.mean()) * (y - y.mean())))
+
+def correlation(x, y):
+    """Coefficient de Pearson sur les points où les deux séries sont définies (0.0 si indéfini)."""
+    x, y = _paired(x, y)
+    if x.size < 2:
+        return 0.0
+    dx = x - x.mean()
+    dy = y - y.mean()
+    denominator = np.sqrt(np.dot(dx, dx) * np.dot(dy, dy))
+    if denominator == 0:
+        return 0.0
+    return float(np.dot(dx, dy) / denominator)
+
+def _moments(series, centers=None):
+    """Sommes croisées sur les paires de points communs, en quelques produits matriciels.
+
+    series : tableau (k, n), une série par ligne. Retourne (counts, sx, sy, sxx, syy, sxy)
+    où l'élément [i, j] ne porte que sur les instants où i et j sont tous deux définis.
+    Les sommes portent sur les écarts à centers (par défaut la moyenne de chaque série).
+    """
+    data = np.atleast_2d(as_array(series))
+    mask = np.isfinite(data)
+    if centers is None:
+        # Centrer chaque série sur sa moyenne limite les erreurs d'arrondi de la formule non centrée
+        centers = np.where(mask, data, 0.0).sum(axis=1) / np.maximum(mask.sum(axis=1), 1)
+    filled = np.where(mask, data - centers[:, None], 0.0)
+    m = mask.astype(float)
+
+    counts = m @ m.T
+    sx = filled @ m.T          # somme de x_i là où j est défini
+    sy = sx.T                  # somme de x_j là où i est défini
+    sxx = (filled ** 2) @ m.T
+    syy = sxx.T
+    sxy = filled @ filled.T
+    return counts, sx, sy, sxx, syy, sxy
+
+def covariance_matrix(series):
+    """Matrice des covariances de toutes les séries (une par ligne) en une seule passe."""
+    counts, sx, sy, sxx, syy, sxy = _moments(series)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = (sxy - sx * sy / counts) / counts
+    return np.where(counts > 0, cov, 0.0)
+
+def _correlation_from_moments(counts, sx, sy, sxx, syy, sxy):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sy / counts
+        var_x = sxx - sx ** 2 / counts
+        var_y = syy - sy ** 2 / counts
+        corr = cov / np.sqrt(var_x * var_y)
+    corr = np.where((counts >= 2) & np.isfinite(corr), corr, 0.0)
+    corr = np.clip(corr, -1.0, 1.0)
+    defined = np.diag(var_x) > 0
+    np.fill_diagonal(corr, np.where(defined, 1.0, 0.0))
+    return corr
+
+def correlation_matrix(series):
+    """Matrice des coefficients de Pearson de toutes les séries (une par ligne) en une seule passe.
+
+    Chaque coefficient est calculé sur les instants communs aux deux séries ; 0.0 s'il est indéfini.
+    """
+    return _correlation_from_moments(*_moments(series))
+
+def blockwise_correlation_matrix(blocks):
+    """Comme correlation_matrix, mais les séries arrivent par tranches de temps successives.
+
+    blocks : itérable de tableaux (k, n_i), les mêmes k séries sur des instants consécutifs.
+    Seuls une tranche et les sommes (k, k) sont en mémoire, quelle que soit la durée totale.
+    Chaque série est centrée sur sa moyenne dans la première tranche où elle est définie.
+    Retourne (corr, counts), counts étant le nombre d'instants communs à chaque paire.
+    """
+    totals = None
+    centers = None
+    for block in blocks:
+        block = np.atleast_2d(as_array(block))
+        mask = np.isfinite(block)
+        if centers is None:
+            centers = np.full(len(block), np.nan)
+        new = np.isnan(centers) & mask.any(axis=1)
+        centers[new] = np.where(mask, block, 0.0)[new].sum(axis=1) / mask[new].sum(axis=1)
+        sums = _moments(block, np.nan_to_num(centers))
+        totals = sums if totals is None else [total + part for total, part in zip(totals, sums)]
+    if totals is None:
+        return np.zeros((0, 0)), np.zeros((0, 0))
+    return _correlation_from_moments(*totals), totals[0]
+
+def chunked_summary(chunks, x=0, y=1):
+    """Statistiques de colonnes lues par tranches (tuples de tableaux), sans garder les tranches.
+
+    Retourne (nombre de lignes, moyenne de chaque colonne, corrélation des colonnes x et y),
+    les mêmes valeurs que mean() et correlation() sur les colonnes complètes.
+    """
+    count = 0
+    sums = None
+    defined = None
+
+    def pairs():
+        nonlocal count, sums, defined
+        for columns in chunks:
+            data = np.vstack([as_array(column) for column in columns])
+            mask = np.isfinite(data)
+            count += data.shape[1]
+            part = np.where(mask, data, 0.0).sum(axis=1)
+            sums = part if sums is None else sums + part
+            defined = mask.sum(axis=1) if defined is None else defined + mask.sum(axis=1)
+            yield data[[x, y]]
+
+    corr, _ = blockwise_correlation_matrix(pairs())
+    if sums is None:
+        return 0, [], 0.0
+    means = [float(total / n) if n else 0.0 for total, n in zip(sums, defined)]
+    return count, means, float(corr[0, 1])
+
+# --- Corrélation décalée ---
+
+def resample(ts, values, start, step, size):
+    """Moyenne des valeurs par tranche de step secondes à partir de start ; NaN pour les tranches vides."""
+    ts = np.asarray(ts, dtype=np.int64)
+    values = as_array(values)
+    bins = (ts - start) // step
+    keep = np.isfinite(values) & (bins >= 0) & (bins < size)
+    counts = np.bincount(bins[keep], minlength=size)
+    sums = np.bincount(bins[keep], weights=values[keep], minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+def fill_gaps(data, max_gap):
+    """Interpole linéairement les trous d'au plus max_gap points encadrés par deux valeurs ;
+    les trous plus longs et les bords restent NaN."""
+    x = as_array(data).copy()
+    for row in np.atleast_2d(x):
+        valid = np.isfinite(row)
+        if valid.sum() < 2:
+            continue
+        index = np.arange(len(row))
+        previous = np.maximum.accumulate(np.where(valid, index, -1))
+        following = np.minimum.accumulate(np.where(valid, index, len(row))[::-1])[::-1]
+        short = ~valid & (previous >= 0) & (following < len(row)) & (following - previous - 1 <= max_gap)
+        row[short] = np.interp(index[short], index[valid], row[valid])
+    return x
+
+def _lag_sums(a, b, max_lag):
+    """Sommes sum_t a[t] * b[t + lag] pour lag de -max_lag à +max_lag, par FFT (dernier axe).
+
+    Avec une taille de FFT d'au moins n + max_lag, la corrélation circulaire ne replie
+    jamais les décalages demandés sur la série : seuls les zéros de complément s'y ajoutent.
+    """
+    n = a.shape[-1]
+    size = 1 << int(np.ceil(np.log2(n + max_lag)))
+    c = np.fft.irfft(np.conj(np.fft.rfft(a, size)) * np.fft.rfft(b, size), size)
+    return np.concatenate([c[..., size - max_lag:], c[..., :max_lag + 1]], axis=-1)
+
+def cross_correlation(x, y, max_lag, min_count=2):
+    """Coefficients de Pearson entre x[t] et y[t + lag] pour lag de -max_lag à +max_lag.
+
+    x et y : séries échantillonnées sur la même grille régulière, une par ligne (k, n) ou
+    une seule (n,) ; NaN marque les points absents. Chaque coefficient porte sur les instants
+    où les deux séries sont définies, comme correlation(), mais toutes les sommes sont
+    calculées en O(n log n) par FFT au lieu de O(n * max_lag).
+    Retourne (lags, corr) ; corr vaut 0.0 là où moins de min_count points se recouvrent.
+    """
+    x = as_array(x)
+    y = as_array(y)
+    if x.shape != y.shape:
+        raise ValueError("Les deux séries doivent avoir la même longueur.")
+    max_lag = min(max_lag, x.shape[-1] - 1)
+    mx = np.isfinite(x)
+    my = np.isfinite(y)
+    # Centrer limite les erreurs d'arrondi, comme dans _moments
+    cx = np.where(mx, x, 0.0).sum(axis=-1, keepdims=True) / np.maximum(mx.sum(axis=-1, keepdims=True), 1)
+    cy = np.where(my, y, 0.0).sum(axis=-1, keepdims=True) / np.maximum(my.sum(axis=-1, keepdims=True), 1)
+    x0 = np.where(mx, x - cx, 0.0)
+    y0 = np.where(my, y - cy, 0.0)
+    mx = mx.astype(float)
+    my = my.astype(float)
+
+    counts = np.rint(_lag_sums(mx, my, max_lag))
+    sx = _lag_sums(x0, my, max_lag)
+    sy = _lag_sums(mx, y0, max_lag)
+    sxx = _lag_sums(x0 ** 2, my, max_lag)
+    syy = _lag_sums(mx, y0 ** 2, max_lag)
+    sxy = _lag_sums(x0, y0, max_lag)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = sxy - sx * sy / counts
+        var_x = sxx - sx ** 2 / counts
+        var_y = syy - sy ** 2 / counts
+        corr = cov / np.sqrt(var_x * var_y)
+    # Variances nulles à l'arrondi près : coefficient indéfini
+    defined = (counts >= min_count) & (var_x > 1e-9 * np.maximum(sxx, 1)) & (var_y > 1e-9 * np.maximum(syy, 1))
+    corr = np.clip(np.where(defined & np.isfinite(corr), corr, 0.0), -1.0, 1.0)
+    return np.arange(-max_lag, max_lag + 1), corr
+
+def peak_lag(lags, corr):
+    """(décalage, coefficient) où |corr| est maximal, sur le dernier axe."""
+    corr = np.asarray(corr)
+    best = np.abs(corr).argmax(axis=-1)
+    return lags[best], np.take_along_axis(corr, best[..., None], axis=-1)[..., 0]
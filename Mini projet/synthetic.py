@@ -0,0 +1,175 @@
+import argparse
+import os
+import sqlite3
+
+import numpy as np
+
+import moments
+import rollup
+import runlength
+import schema
+
+# Deterministic synthetic car park / bike station series, for benchmarks beyond the real database.
+#
+# Every car park "P+R Station NNN" is paired with a bike station "Station NNN" (same names as
+# matching.py expects). Each series follows a daily cycle (weekday commute peak, quieter
+# weekends) plus smoothed noise, is clipped to the station capacity, has scraper outages
+# (every station missing for a while), isolated missing rows and a few None values.
+# The same (stations, months, seed, interval) always gives the same database.
+
+START = 1735686000  # 2025-01-01 00:00 in Montpellier (UTC+1)
+UTC_OFFSET = 3600
+DAY = 86400
+MONTH_DAYS = 30
+
+OUTAGES_PER_WEEK = 2
+MISSING_RATE = 0.001   # rows lost on their own
+NONE_RATE = 0.002      # rows stored with available = None
+
+def station_names(stations):
+    cars = [f"P+R Station {i + 1:03d}" for i in range(stations)]
+    bikes = [f"Station {i + 1:03d}" for i in range(stations)]
+    return cars, bikes
+
+def timestamps(rng, months, interval):
+    """Tick timestamps of the whole period, minus the scraper outages."""
+    ts = START + interval * np.arange(months * MONTH_DAYS * DAY // interval, dtype=np.int64)
+    keep = np.ones(len(ts), dtype=bool)
+    outages = rng.poisson(OUTAGES_PER_WEEK * months * MONTH_DAYS / 7)
+    for start in rng.integers(0, len(ts), outages):
+        keep[start:start + rng.integers(5, 180) * 60 // interval] = False
+    return ts[keep]
+
+def daily_profile(ts):
+    """Share of the commuter demand at each ts: morning arrivals, evening departures, half on weekends."""
+    hour = (ts + UTC_OFFSET) % DAY / 3600
+    weekday = ((ts + UTC_OFFSET) // DAY + 3) % 7  # 1970-01-01 was a Thursday
+    occupied = 1 / (1 + np.exp(-(hour - 8))) - 1 / (1 + np.exp(-(hour - 18)))
+    return np.where(weekday >= 5, 0.5, 1.0) * occupied
+
+def smooth_noise(rng, size, scale, width=60):
+    kernel = np.exp(-np.arange(width) / (width / 4))
+    noise = np.convolve(rng.normal(0, 1, size + width), kernel / np.sqrt((kernel ** 2).sum()), 'valid')
+    return scale * noise[:size]
+
+def availability(rng, occupancy, capacity):
+    """Available places for an occupancy series, with missing rows (mask) and None values (NaN)."""
+    available = np.clip(np.rint(capacity * (1 - occupancy)), 0, capacity)
+    available[rng.random(len(available)) < NONE_RATE] = np.nan
+    return available, rng.random(len(available)) >= MISSING_RATE
+
+def _rows(key, ts, available, keep, columns):
+    for t, a, extra in zip(ts[keep].tolist(), available[keep].tolist(), zip(*[c[keep].tolist() for c in columns])):
+        yield (key, t, None if a != a else int(a)) + extra
+
+def generate(db_name, stations, months, seed=0, interval=60):
+    """Writes the synthetic series into a new database db_name; returns the number of samples per kind."""
+    rng = np.random.default_rng(seed)
+    ts = timestamps(rng, months, interval)
+    profile = daily_profile(ts)
+    car_names, bike_names = station_names(stations)
+
+    conn = sqlite3.connect(db_name)
+    schema.migrate(conn)
+    conn.execute("PRAGMA journal_mode = OFF")  # scratch database: nothing to recover
+    conn.execute("PRAGMA synchronous = OFF")
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    count = 0
+    for i, (car_name, bike_name) in enumerate(zip(car_names, bike_names)):
+        cursor.execute("INSERT INTO station (kind, ngsi_id, name) VALUES ('car', ?, ?)",
+                       (f"urn:ngsi-ld:parking:{i + 1:03d}", car_name))
+        car_key = cursor.lastrowid
+        cursor.execute("INSERT INTO station (kind, ngsi_id, name) VALUES ('bike', ?, ?)",
+                       (f"urn:ngsi-ld:station:{i + 1:03d}", bike_name))
+        bike_key = cursor.lastrowid
+
+        car_capacity = int(rng.integers(150, 1000))
+        bike_capacity = int(rng.integers(8, 40))
+        demand = rng.uniform(0.3, 0.9) * profile
+        car_occupancy = 0.1 + demand + smooth_noise(rng, len(ts), 0.05)
+        # Bikes docked at a P+R: taken when cars arrive (coupling > 0) or brought in (coupling < 0)
+        coupling = rng.uniform(-1, 1)
+        bike_occupancy = 0.5 + coupling * (demand - demand.mean()) + smooth_noise(rng, len(ts), 0.1)
+
+        car_available, car_keep = availability(rng, car_occupancy, car_capacity)
+        bike_available, bike_keep = availability(rng, bike_occupancy, bike_capacity)
+        total = np.full(len(ts), car_capacity)
+        status = np.full(len(ts), 'Open', dtype=object)
+        cursor.executemany("INSERT INTO car_sample (station_key, ts, available, total, status) VALUES (?, ?, ?, ?, ?)",
+                           _rows(car_key, ts, car_available, car_keep, (total, status)))
+        free = bike_capacity - np.nan_to_num(bike_available).astype(np.int64)
+        total = np.full(len(ts), bike_capacity)
+        status = np.full(len(ts), 'working', dtype=object)
+        cursor.executemany('''
+            INSERT INTO bike_sample (station_key, ts, available, free, total, status) VALUES (?, ?, ?, ?, ?, ?)
+        ''', _rows(bike_key, ts, bike_available, bike_keep, (free, total, status)))
+        count += int(car_keep.sum())
+
+    runlength.log_stored_ticks(cursor)
+    rollup.rebuild(cursor)
+    conn.commit()
+    moments.rebuild(conn)
+    conn.commit()
+    conn.close()
+    return count
+
+# --- NGSI payloads, as served by the open-data portal ---
+
+def car_item(ngsi_id, name, available, total, status):
+    return {
+        'id': ngsi_id,
+        'type': 'OffStreetParking',
+        'name': {'type': 'Text', 'value': name},
+        'availableSpotNumber': {'type': 'Number', 'value': available},
+        'totalSpotNumber': {'type': 'Number', 'value': total},
+        'status': {'type': 'Text', 'value': status},
+    }
+
+def bike_item(ngsi_id, address, available, free, total, status):
+    return {
+        'id': ngsi_id,
+        'type': 'BikeHireDockingStation',
+        'address': {'type': 'PostalAddress', 'value': {'streetAddress': address}},
+        'availableBikeNumber': {'type': 'Number', 'value': available},
+        'freeSlotNumber': {'type': 'Number', 'value': free},
+        'totalSlotNumber': {'type': 'Number', 'value': total},
+        'status': {'type': 'Text', 'value': status},
+    }
+
+def payloads(stations, ts, seed=0):
+    """(car items, bike items) of one tick at ts, following the same daily cycle as generate()."""
+    rng = np.random.default_rng(seed)
+    car_capacity = rng.integers(150, 1000, stations)
+    bike_capacity = rng.integers(8, 40, stations)
+    demand = rng.uniform(0.3, 0.9, stations) * daily_profile(np.int64(ts))
+    coupling = rng.uniform(-1, 1, stations)
+    noise = np.random.default_rng([seed, int(ts)]).normal(0, 1, (2, stations))
+    car_available = np.clip(np.rint(car_capacity * (0.9 - demand - 0.05 * noise[0])), 0, car_capacity).astype(int)
+    bike_occupancy = 0.5 + coupling * (demand - demand.mean()) + 0.1 * noise[1]
+    bike_available = np.clip(np.rint(bike_capacity * (1 - bike_occupancy)), 0, bike_capacity).astype(int)
+
+    car_names, bike_names = station_names(stations)
+    cars = [car_item(f"urn:ngsi-ld:parking:{i + 1:03d}", name, int(car_available[i]), int(car_capacity[i]), 'Open')
+            for i, name in enumerate(car_names)]
+    bikes = [bike_item(f"urn:ngsi-ld:station:{i + 1:03d}", name, int(bike_available[i]),
+                       int(bike_capacity[i] - bike_available[i]), int(bike_capacity[i]), 'working')
+             for i, name in enumerate(bike_names)]
+    return cars, bikes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic parking database for benchmarks.")
+    parser.add_argument('db', help="database file to create")
+    parser.add_argument('--stations', type=int, default=20, help="car park / bike station pairs (default: 20)")
+    parser.add_argument('--months', type=int, default=1, help="months of data (default: 1)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--interval', type=int, default=60, help="seconds between samples (default: 60)")
+    parser.add_argument('--force', action='store_true', help="replace db if it exists")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f"{args.db} exists (use --force to replace it)")
+        os.remove(args.db)
+    count = generate(args.db, args.stations, args.months, args.seed, args.interval)
+    print(f"{args.db}: {args.stations} car parks and {args.stations} bike stations, {count} car samples.")
@@ -0,0 +1,64 @@
+# Streaming joins of two time series that are not sampled at exactly the same instants.
+#
+# Both inputs are iterables of rows (group, ts, *values) sorted by (group, ts), e.g. two
+# sqlite cursors ordered the same way. group tells independent series apart (one per
+# parking pair in a batch read); a single series can use a constant group. The joins walk
+# both inputs once, in linear time and constant memory.
+
+TOLERANCE = 60  # seconds, one scraper interval
+
+def asof_join(left, right, tolerance=TOLERANCE):
+    """For each left row, appends the values of the latest right row of the same group
+    taken at or before it, at most tolerance seconds earlier. Left rows without one are dropped.
+
+    Yields (group, ts, *left_values, *right_values) with ts the left timestamp.
+    """
+    right = iter(right)
+    upcoming = next(right, None)
+    current = None
+    for row in left:
+        group, ts = row[0], row[1]
+        while upcoming is not None and (upcoming[0], upcoming[1]) <= (group, ts):
+            current = upcoming
+            upcoming = next(right, None)
+        if current is not None and current[0] == group and ts - current[1] <= tolerance:
+            yield row + current[2:]
+
+def _last_per_bucket(rows, width):
+    # Keeps the last sample of each fixed-width bucket: (group, bucket_start, *values)
+    pending = None
+    for row in rows:
+        key = (row[0], row[1] - row[1] % width)
+        if pending is not None and key != pending[:2]:
+            yield pending
+        pending = key + tuple(row[2:])
+    if pending is not None:
+        yield pending
+
+def bucket_join(left, right, width):
+    """Aligns both series on fixed-width time buckets (last sample of each bucket) and keeps
+    the buckets present on both sides.
+
+    Yields (group, bucket_start, *left_values, *right_values).
+    """
+    left = _last_per_bucket(left, width)
+    right = _last_per_bucket(right, width)
+    a = next(left, None)
+    b = next(right, None)
+    while a is not None and b is not None:
+        key_a = a[:2]
+        key_b = b[:2]
+        if key_a == key_b:
+            yield a + b[2:]
+            a = next(left, None)
+            b = next(right, None)
+        elif key_a < key_b:
+            a = next(left, None)
+        else:
+            b = next(right, None)
+
+def join(left, right, tolerance=TOLERANCE, bucket=None):
+    """bucket_join when a bucket width is given, asof_join otherwise."""
+    if bucket:
+        return bucket_join(left, right, bucket)
+    return asof_join(left, right, tolerance)
@@ -2,72 +2,50 @@ import sqlite3
 import matplotlib.pyplot as plt
 from datetime import datetime
 import sys
-import unicodedata
+import time
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
-DB_NAME = "parking_data.db"
+import archive
+import chunks
+import db
+import downsample
+import matching
+import rollup
+import runlength
+import schema
 
-def normalize_string(s):
-    return ''.join(c for c in unicodedata.normalize('NFD', s)
-                  if unicodedata.category(c) != 'Mn').lower()
-
-def is_match(name1, name2):
-    n1 = normalize_string(name1)
-    n2 = normalize_string(name2)
-    
-    if n1 == n2:
-        return True
-    # Check for containment but ensure it's significant
-    if len(n1) > 3 and n1 in n2:
-        return True
-    if len(n2) > 3 and n2 in n1:
-        return True
-    return False
+MARKER_LIMIT = 500  # above this many points per line, draw the line without markers
+FIGSIZE = (12, 6)
+PREFETCH = 3  # most-viewed series loaded in the background while the menu is shown
 
+@db.cached
 def get_all_parkings():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
     car_parkings = []
     bike_parkings = []
+    pairs = []
     
-    # Get Car Parkings
     try:
-        cursor.execute("SELECT DISTINCT name FROM car_parking ORDER BY name")
-        car_parkings = [row[0] for row in cursor.fetchall()]
-    except sqlite3.OperationalError:
-        pass 
-
-    # Get Bike Parkings
-    try:
-        cursor.execute("SELECT DISTINCT address FROM bike_parking ORDER BY address")
-        bike_parkings = [row[0] for row in cursor.fetchall()]
+        car_parkings, bike_parkings, pairs = matching.get_catalog(db.reader())
     except sqlite3.OperationalError:
         pass
-        
-    conn.close()
     
     merged_parkings = []
-    used_bikes = set()
+    bike_for_car = dict(pairs)
+    used_bikes = set(bike_for_car.values())
     
-    # Try to match cars with bikes
     for car_name in car_parkings:
-        match_found = False
-        for bike_name in bike_parkings:
-            if bike_name in used_bikes:
-                continue
-                
-            if is_match(car_name, bike_name):
-                merged_parkings.append({
-                    'type': 'Both',
-                    'display_name': f"{car_name}", 
-                    'car_name': car_name,
-                    'bike_name': bike_name
-                })
-                used_bikes.add(bike_name)
-                match_found = True
-                break
-        
-        if not match_found:
+        if car_name in bike_for_car:
+            merged_parkings.append({
+                'type': 'Both',
+                'display_name': f"{car_name}", 
+                'car_name': car_name,
+                'bike_name': bike_for_car[car_name]
+            })
+        else:
             merged_parkings.append({
                 'type': 'Car',
                 'display_name': car_name,
@@ -87,53 +65,301 @@ def get_all_parkings():
     merged_parkings.sort(key=lambda x: x['display_name'])
     return merged_parkings
 
-def get_parking_data(parking_name, parking_type):
-    conn = sqlite3.connect(DB_NAME)
+SERIES_KINDS = {'Car': 'car', 'Bike': 'bike'}
+
+@db.cached
+def get_parking_data(parking_name, parking_type, max_points=None):
+    """(epoch, available) rows of a parking, ordered by time, archived days included.
+
+    With max_points, a longer series is reduced to the minimum and maximum sample of each
+    time slice, so peaks and troughs survive: from the rollups for slices of an hour or more,
+    in SQL while every sample is still in sqlite, else in NumPy.
+    """
+    conn = db.reader()
     cursor = conn.cursor()
+    kind = SERIES_KINDS[parking_type]
+    table = runlength.sample_table(conn, kind)  # expands change-only rows back to one per tick
+    horizon = archive.get_horizon(conn)
     
-    if parking_type == 'Car':
-        query = """
-            SELECT timestamp, availableSpotNumber 
-            FROM car_parking 
-            WHERE name = ? 
-            ORDER BY timestamp
-        """
-    else: # Bike
-        query = """
-            SELECT timestamp, availableBikeNumber 
-            FROM bike_parking 
-            WHERE address = ? 
-            ORDER BY timestamp
-        """
-        
-    cursor.execute(query, (parking_name,))
-    data = cursor.fetchall()
-    conn.close()
+    # Epoch-second timestamps straight from the fact tables, decoded in bulk by process_data
+    query = f"""
+        SELECT x.ts, x.available 
+        FROM station s 
+        JOIN {table} x ON x.station_key = s.station_key 
+        WHERE s.kind = ? AND s.name = ? 
+        ORDER BY x.ts
+    """
+    params = (kind, parking_name)
+    
+    if max_points:
+        if horizon:
+            # Part of the series is archived: the hourly rollups still cover all of it
+            cursor.execute(f"""
+                SELECT COALESCE(SUM(r.n), 0), MIN(r.bucket), MAX(r.bucket) + {rollup.HOUR - 1} 
+                FROM station s 
+                JOIN rollup r ON r.station_key = s.station_key AND r.period = {rollup.HOUR} 
+                WHERE s.kind = ? AND s.name = ?
+            """, params)
+        else:
+            cursor.execute(f"""
+                SELECT COUNT(*), MIN(x.ts), MAX(x.ts) 
+                FROM station s 
+                JOIN {table} x ON x.station_key = s.station_key 
+                WHERE s.kind = ? AND s.name = ?
+            """, params)
+        count, first, last = cursor.fetchone()
+        width = max(1, -(-(last - first + 1) * 2 // max_points)) if count > max_points else 0
+        if count > max_points and width >= rollup.HOUR:
+            # Slices of an hour or more: merged from the hourly / daily rollups, which keep each
+            # bucket's min and max with the time it was first reached
+            period = rollup.DAY if width >= rollup.DAY else rollup.HOUR
+            slice_query = f"""
+                SELECT COALESCE(r.avail_{{1}}_ts, r.bucket) AS ts, {{0}}(r.avail_{{1}}) AS available 
+                FROM station s 
+                JOIN rollup r ON r.station_key = s.station_key AND r.period = {period} 
+                WHERE s.kind = :kind AND s.name = :name AND r.avail_{{1}} IS NOT NULL 
+                GROUP BY (r.bucket - :first) / :width
+            """
+            cursor.execute(f"""
+                SELECT ts, available FROM (
+                    {slice_query.format('MIN', 'min')} 
+                    UNION 
+                    {slice_query.format('MAX', 'max')}
+                ) 
+                ORDER BY ts
+            """, {'kind': kind, 'name': parking_name, 'first': first, 'width': width})
+            return cursor.fetchall()
+        if count > max_points and horizon:
+            # Read chunk by chunk: only the running min / max of each slice stay in memory
+            epochs, values = downsample.minmax_chunks(series_chunks(parking_name, parking_type), first, last,
+                                                      max_points // 2)
+            return list(zip(epochs.astype(np.int64).tolist(), values.tolist()))
+        if count > max_points:
+            # Two points (min and max) per slice; SQLite returns the ts of the row holding the MIN/MAX
+            slice_query = f"""
+                SELECT x.ts AS ts, {{}}(x.available) AS available 
+                FROM station s 
+                JOIN {table} x ON x.station_key = s.station_key 
+                WHERE s.kind = :kind AND s.name = :name AND x.available IS NOT NULL 
+                GROUP BY (x.ts - :first) / :width
+            """
+            query = f"""
+                SELECT ts, available FROM (
+                    {slice_query.format('MIN')} 
+                    UNION 
+                    {slice_query.format('MAX')}
+                ) 
+                ORDER BY ts
+            """
+            params = {'kind': kind, 'name': parking_name, 'first': first, 'width': width}
+    
+    if horizon:
+        data = list(archive.series_rows(conn, kind, parking_name))
+    else:
+        cursor.execute(query, params)
+        data = cursor.fetchall()
     return data
 
+SERIES_TYPES = (np.int64, float)  # epoch seconds, available (NaN for NULL)
+
+def series_chunks(parking_name, parking_type, size=chunks.CHUNK_SIZE):
+    """Complete series of a parking, archived days included, as (epochs, values) arrays of at most size rows."""
+    conn = db.reader()
+    rows = archive.series_rows(conn, SERIES_KINDS[parking_type], parking_name)
+    return chunks.column_chunks(rows, SERIES_TYPES, size)
+
+@db.cached
+def get_parking_series(parking_name, parking_type):
+    """(epochs, values) arrays of the complete series, filled chunk by chunk without a list of rows."""
+    return chunks.collect(series_chunks(parking_name, parking_type), SERIES_TYPES)
+
+def export_series(path, selection):
+    """Writes the complete series of (name, type) pairs to a CSV file, chunk by chunk; returns the row count."""
+    def columns():
+        for name, parking_type in selection:
+            for epochs, values in series_chunks(name, parking_type):
+                yield (np.full(len(epochs), parking_type), np.full(len(epochs), name), epochs, values)
+    return chunks.write_csv(path, ['type', 'name', 'ts', 'available'], columns())
+
+def to_local_datetime64(epochs):
+    """Epoch seconds -> naive local datetime64[s], like datetime.fromtimestamp but vectorized."""
+    epochs = np.asarray(epochs, dtype=np.int64)
+    if epochs.size == 0:
+        return epochs.astype('datetime64[s]')
+    # UTC offsets only change on hour boundaries (DST), so look them up once per distinct hour
+    hours, inverse = np.unique(epochs // 3600, return_inverse=True)
+    offsets = np.array([time.localtime(int(h) * 3600).tm_gmtoff for h in hours], dtype=np.int64)
+    return (epochs + offsets[inverse]).astype('datetime64[s]')
+
+def _parse_timestamp_strings(strings):
+    try:
+        return np.array(strings, dtype='datetime64[us]'), np.ones(len(strings), dtype=bool)
+    except ValueError:
+        # At least one malformed value: parse one by one and drop the bad ones
+        parsed = []
+        for s in strings:
+            try:
+                parsed.append(np.datetime64(datetime.fromisoformat(s), 'us'))
+            except (TypeError, ValueError):
+                parsed.append(np.datetime64('NaT'))
+        parsed = np.array(parsed, dtype='datetime64[us]')
+        return parsed, ~np.isnat(parsed)
+
 def process_data(raw_data):
-    timestamps = []
-    values = []
-    for ts_str, val in raw_data:
-        try:
-            ts = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S.%f")
-        except ValueError:
+    """Turns (timestamp, value) rows into (datetime64 array, float array), None values becoming NaN.
+
+    Timestamps are epoch seconds (fact tables) or "YYYY-MM-DD HH:MM:SS[.ffffff]" strings (legacy views).
+    """
+    if len(raw_data) == 0:
+        return np.array([], dtype='datetime64[s]'), np.array([], dtype=float)
+
+    if isinstance(raw_data[0][0], str):
+        timestamps, valid = _parse_timestamp_strings([row[0] for row in raw_data])
+        values = np.array([row[1] for row in raw_data], dtype=float)
+        return timestamps[valid], values[valid]
+
+    count = len(raw_data)
+    epochs = np.fromiter((row[0] for row in raw_data), dtype=np.int64, count=count)
+    values = np.fromiter((np.nan if row[1] is None else row[1] for row in raw_data), dtype=float, count=count)
+    return to_local_datetime64(epochs), values
+
+def plot_width(fig):
+    """Width of the figure in pixels: no point in drawing more samples than that."""
+    return int(fig.get_figwidth() * fig.dpi)
+
+def marker_for(ts, marker):
+    # Markers only help when individual samples can be told apart
+    return marker if len(ts) <= MARKER_LIMIT else None
+
+def load_series(parking_name, parking_type, downsampling, width):
+    """Fetches and decodes a series, reduced to about width points ('minmax', 'lttb') or complete ('none')."""
+    if downsampling == 'minmax':
+        return process_data(get_parking_data(parking_name, parking_type, max_points=2 * width))
+    epochs, val = get_parking_series(parking_name, parking_type)
+    ts = to_local_datetime64(epochs)
+    if downsampling == 'lttb':
+        return downsample.lttb(ts, val, width)
+    return ts, val
+
+# --- Persisted state: station catalog and view counts ---
+#
+# Kept in a JSON file next to the database (the readers are read-only). The merged parking
+# list is reused until matching.catalog_version() changes, i.e. until new stations appear.
+
+def state_path():
+    return os.path.splitext(db.DB_NAME)[0] + "_view.json"
+
+def load_state():
+    try:
+        with open(state_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state):
+    # Written aside then renamed, so a concurrent launch never reads half a file
+    tmp = state_path() + ".tmp"
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(tmp, state_path())
+    except OSError:
+        pass  # read-only directory: the state is only an optimization
+
+def load_catalog(state):
+    """Merged parking list, from the state file while no new station has been scraped."""
+    try:
+        version = matching.catalog_version(db.reader())
+    except sqlite3.OperationalError:
+        return get_all_parkings()
+    if state.get('catalog_version') == version and 'parkings' in state:
+        return state['parkings']
+    parkings = get_all_parkings()
+    state['catalog_version'] = version
+    state['parkings'] = parkings
+    save_state(state)
+    return parkings
+
+def series_of(parking):
+    """(name, type) of the series plotted for a parking."""
+    if parking['type'] == 'Both':
+        return [(parking['car_name'], 'Car'), (parking['bike_name'], 'Bike')]
+    return [(parking['name'], parking['type'])]
+
+def record_view(state, parking):
+    views = state.setdefault('views', {})
+    for name, parking_type in series_of(parking):
+        key = f"{parking_type}:{name}"
+        views[key] = views.get(key, 0) + 1
+    save_state(state)
+
+def most_viewed(state, parkings, count=PREFETCH):
+    """The count most-viewed series that are still in the catalog."""
+    views = state.get('views', {})
+    known = [series for parking in parkings for series in series_of(parking)]
+    ranked = sorted((series for series in known if views.get(f"{series[1]}:{series[0]}")),
+                    key=lambda series: -views[f"{series[1]}:{series[0]}"])
+    return ranked[:count]
+
+def default_width():
+    """plot_width() of a FIGSIZE figure, known before the figure exists."""
+    return int(FIGSIZE[0] * plt.rcParams['figure.dpi'])
+
+class Prefetcher:
+    """Loads and decodes series in a background thread; get() waits for one still loading."""
+
+    def __init__(self, downsampling):
+        self.downsampling = downsampling
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch')
+        self.futures = {}
+
+    def start(self, series, width):
+        for name, parking_type in series:
+            key = (name, parking_type, width)
+            self.futures[key] = self.executor.submit(load_series, name, parking_type, self.downsampling, width)
+
+    def get(self, name, parking_type, width):
+        future = self.futures.get((name, parking_type, width))
+        if future is not None:
             try:
-                ts = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                continue
-        timestamps.append(ts)
-        values.append(val)
-    return timestamps, values
+                return future.result()
+            except Exception:
+                pass  # loaded again below, in the foreground
+        return load_series(name, parking_type, self.downsampling, width)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
 def main():
+    parser = argparse.ArgumentParser(description="Plot the availability of a car park and/or bike station.")
+    parser.add_argument('--downsample', choices=['minmax', 'lttb', 'none'], default='minmax',
+                        help="reduce long series to the figure width: per-pixel min/max in SQL (default), "
+                             "LTTB in NumPy, or plot every sample")
+    parser.add_argument('--export', default=None, metavar='FILE.csv',
+                        help="write the complete series of the selected parking to a CSV file instead of plotting")
+    args = parser.parse_args()
+    downsampling = args.downsample
+
+    schema.upgrade_db(db.DB_NAME)
     print("Fetching parking list...")
-    parkings = get_all_parkings()
+    state = load_state()
+    parkings = load_catalog(state)
 
     if not parkings:
-        print(f"No parking data found in {DB_NAME}. Make sure to run scraper.py first.")
+        print(f"No parking data found in {db.DB_NAME}. Make sure to run scraper.py first.")
         return
 
+    # The menu waits for the user: meanwhile, load the series they open most often
+    prefetcher = Prefetcher(downsampling)
+    if not args.export:
+        prefetcher.start(most_viewed(state, parkings), default_width())
+    try:
+        show(parkings, state, prefetcher, downsampling, args.export)
+    finally:
+        prefetcher.close()
+
+def show(parkings, state, prefetcher, downsampling, export=None):
+    """Menu, then the plot (or CSV export) of the chosen parking."""
     print("\nAvailable Parkings:")
     for i, p in enumerate(parkings):
         if p['type'] == 'Both':
@@ -157,24 +383,28 @@ def main():
             print("Invalid input. Please enter a number.")
 
     p_type = selected_parking['type']
+
+    if export:
+        count = export_series(export, series_of(selected_parking))
+        print(f"{count} samples written to {export}.")
+        return
+    record_view(state, selected_parking)
     
     # We need to handle the figure creation differently for single vs dual plots
     
     if p_type == 'Both':
+        fig, ax1 = plt.subplots(figsize=FIGSIZE)
+        max_points = plot_width(fig)
+        
         print(f"\nFetching data for Car parking '{selected_parking['car_name']}'...")
-        car_data = get_parking_data(selected_parking['car_name'], 'Car')
+        ts_car, val_car = prefetcher.get(selected_parking['car_name'], 'Car', max_points)
         print(f"Fetching data for Bike parking '{selected_parking['bike_name']}'...")
-        bike_data = get_parking_data(selected_parking['bike_name'], 'Bike')
-        
-        ts_car, val_car = process_data(car_data)
-        ts_bike, val_bike = process_data(bike_data)
-        
-        fig, ax1 = plt.subplots(figsize=(12, 6))
+        ts_bike, val_bike = prefetcher.get(selected_parking['bike_name'], 'Bike', max_points)
         
         color = 'tab:blue'
         ax1.set_xlabel('Time')
         ax1.set_ylabel('Available Car Spots', color=color)
-        ax1.plot(ts_car, val_car, color=color, marker='o', linestyle='-', label='Car Spots')
+        ax1.plot(ts_car, val_car, color=color, marker=marker_for(ts_car, 'o'), linestyle='-', label='Car Spots')
         ax1.tick_params(axis='y', labelcolor=color)
         ax1.grid(True)
         
@@ -182,23 +412,22 @@ def main():
         
         color = 'tab:green'
         ax2.set_ylabel('Available Bike Spots', color=color)  # we already handled the x-label with ax1
-        ax2.plot(ts_bike, val_bike, color=color, marker='x', linestyle='--', label='Bike Spots')
+        ax2.plot(ts_bike, val_bike, color=color, marker=marker_for(ts_bike, 'x'), linestyle='--', label='Bike Spots')
         ax2.tick_params(axis='y', labelcolor=color)
         
         plt.title(f"Available Spaces Over Time: {selected_parking['display_name']}")
         fig.tight_layout()  # otherwise the right y-label is slightly clipped
         
     else:
-        plt.figure(figsize=(12, 6))
+        fig = plt.figure(figsize=FIGSIZE)
         name = selected_parking['name']
         print(f"\nFetching data for {p_type} parking '{name}'...")
-        data = get_parking_data(name, p_type)
-        ts, val = process_data(data)
+        ts, val = prefetcher.get(name, p_type, plot_width(fig))
         
         color = 'b' if p_type == 'Car' else 'g'
         label = "Available Spots" if p_type == 'Car' else "Available Bikes"
         
-        plt.plot(ts, val, marker='o', linestyle='-', color=color)
+        plt.plot(ts, val, marker=marker_for(ts, 'o'), linestyle='-', color=color)
         plt.title(f"{label} Over Time: {name}")
         plt.xlabel("Time")
         plt.ylabel(label)
@@ -1,10 +1,14 @@
 import requests
 import json
+import os
 
-response_car_parking=requests.get("https://portail-api-data.montpellier3m.fr/offstreetparking")
+# PARKING_API_URL permet d'interroger un autre serveur (ex. Mini projet/replay_server.py)
+BASE_URL = os.environ.get("PARKING_API_URL", "https://portail-api-data.montpellier3m.fr").rstrip('/')
+
+response_car_parking=requests.get(f"{BASE_URL}/offstreetparking")
 data_car_parking = response_car_parking.json()
 
-response_bike_parking=requests.get("https://portail-api-data.montpellier3m.fr/bikestation")
+response_bike_parking=requests.get(f"{BASE_URL}/bikestation")
 data_bike_parking = response_bike_parking.json()
 
 for item in data_car_parking: